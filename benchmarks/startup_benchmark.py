@@ -0,0 +1,140 @@
+"""插件启动耗时基准测试
+
+在独立子进程中模拟宿主加载插件：桩替换 pkg 模块后计时 import plugins.pica_plugin.main，
+再计时 PicaPlugin(host) 与 initialize()，登录被替换为空操作，不访问网络。
+每个样本使用全新进程，结果取中位数。
+
+用法：
+    python benchmarks/startup_benchmark.py [--tree 插件目录] [--runs 15]
+
+对比改动前后可先用 git worktree 检出旧版本，再分别以 --tree 指定两个目录运行。
+本目录没有 __init__.py，宿主加载插件时不会导入。
+"""
+import os
+import sys
+import json
+import time
+import types
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _install_pkg_stub():
+    """只提供插件导入时用到的宿主接口"""
+    def module(name: str) -> types.ModuleType:
+        mod = types.ModuleType(name)
+        sys.modules[name] = mod
+        return mod
+
+    for name in ("pkg", "pkg.plugin", "pkg.platform", "pkg.platform.types"):
+        module(name)
+
+    class BasePlugin:
+        def __init__(self, host):
+            self.host = host
+            self.ap = host.ap
+
+    class Stub:
+        def __init__(self, *args, **kwargs):
+            self.args = args
+            self.kwargs = kwargs
+
+    context = module("pkg.plugin.context")
+    context.register = lambda **kwargs: (lambda cls: cls)
+    context.handler = lambda event: (lambda func: func)
+    context.BasePlugin = BasePlugin
+    context.APIHost = Stub
+    context.EventContext = Stub
+
+    events = module("pkg.plugin.events")
+    events.PersonNormalMessageReceived = type("PersonNormalMessageReceived", (Stub,), {})
+    events.GroupNormalMessageReceived = type("GroupNormalMessageReceived", (Stub,), {})
+
+    message = module("pkg.platform.types.message")
+    for name in ("MessageChain", "Plain", "Image", "ForwardMessageNode", "ForwardMessageDiaplay", "Forward"):
+        setattr(message, name, type(name, (Stub,), {}))
+
+
+class _Logger:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+async def _no_login():
+    return True
+
+
+async def _sample(tree: str) -> dict:
+    # 按宿主的目录结构挂载插件：plugins/pica_plugin -> tree
+    mount = tempfile.mkdtemp(prefix="pica_bench_")
+    os.makedirs(os.path.join(mount, "plugins"))
+    open(os.path.join(mount, "plugins", "__init__.py"), "w").close()
+    os.symlink(tree, os.path.join(mount, "plugins", "pica_plugin"))
+    sys.path.insert(0, mount)
+    _install_pkg_stub()
+
+    started = time.perf_counter()
+    import plugins.pica_plugin.main as plugin_main
+    imported = time.perf_counter()
+
+    # 旧版本在导入时创建client、在首次使用时登录，新版本在后台预热时登录，两者都替换为空操作
+    for module in (plugin_main, sys.modules["plugins.pica_plugin.get_image"]):
+        if hasattr(module, "login"):
+            module.login = _no_login
+
+    host = types.SimpleNamespace(ap=types.SimpleNamespace(logger=_Logger()))
+    plugin = plugin_main.PicaPlugin(host)
+    await plugin.initialize()
+    initialized = time.perf_counter()
+
+    warm_up_task = getattr(plugin, "warm_up_task", None)
+    if warm_up_task:
+        await warm_up_task
+    warmed = time.perf_counter()
+
+    if hasattr(plugin, "destroy"):
+        await plugin.destroy()
+
+    return {
+        "import": (imported - started) * 1000,
+        "initialize": (initialized - imported) * 1000,
+        "import_to_ready": (initialized - started) * 1000,
+        "background_warm_up": (warmed - initialized) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="漫画插件启动耗时基准测试")
+    parser.add_argument("--tree", default=ROOT, help="插件目录，默认为当前仓库")
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--sample", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    tree = os.path.abspath(args.tree)
+
+    if args.sample:
+        print(json.dumps(asyncio.run(_sample(tree))))
+        return
+
+    samples = []
+    # 第一次运行用于生成字节码缓存，不计入结果
+    for i in range(args.runs + 1):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--tree", tree, "--sample"],
+            check=True, capture_output=True, text=True
+        ).stdout
+        if i:
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{tree}（{args.runs} 次，中位数）")
+    for key in samples[0]:
+        values = [sample[key] for sample in samples]
+        print(f"  {key:<20} {statistics.median(values):8.1f}ms  (min {min(values):.1f}ms, max {max(values):.1f}ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+import os
+import asyncio
+import typing
+import dataclasses
+from dataclasses import dataclass, field
+from typing import List, Optional, Callable
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "yaml", "config.yaml")
+
+
+class ConfigError(Exception):
+    pass
+
+
+@dataclass
+class ForwardConfig:
+    sender_name: str = "漫画"
+    sender_id: str = "3870128501"
+
+
+@dataclass
+class LimitConfig:
+    initial_limit: int = 4
+    max_limit: int = 16
+    timeout: float = 30
+
+
+@dataclass
+class ConcurrencyConfig:
+    api: LimitConfig = field(default_factory=lambda: LimitConfig(4, 16, 30))
+    image: LimitConfig = field(default_factory=lambda: LimitConfig(4, 32, 60))
+
+
+@dataclass
+class ContactSheetConfig:
+    enabled: bool = False
+    columns: int = 5
+    cell_width: int = 200
+    concurrency: int = 4
+
+
+@dataclass
+class ExportConfig:
+    default: bool = False
+    format: str = "cbz"
+
+
+@dataclass
+class WarmupConfig:
+    enabled: bool = False
+    quiet_hours: List[int] = field(default_factory=lambda: [2, 7])
+    orders: List[str] = field(default_factory=lambda: ["ld", "vd", "dd"])
+    keywords: List[str] = field(default_factory=list)
+    categories: List[str] = field(default_factory=list)
+    top_n: int = 10
+    chapters: int = 1
+    bandwidth_kbps: int = 2048
+    disk_budget_mb: int = 2048
+    concurrency: int = 2
+    check_interval: int = 300
+
+
+@dataclass
+class WorkerConfig:
+    enabled: bool = False
+    processes: int = 2
+    poll_interval: float = 0.5
+
+
+@dataclass
+class PluginConfig:
+    account: str = ""
+    password: str = ""
+    proxy: Optional[str] = None
+    forward: ForwardConfig = field(default_factory=ForwardConfig)
+    max_preview_pages: int = 10
+    max_search_results: int = 10
+    max_image_height: int = 20000
+    meta_cache_ttl: int = 86400
+    episodes_cache_ttl: int = 600
+    preview_max_width: int = 400
+    preview_max_height: int = 4000
+    config_watch_interval: float = 5
+    concurrency: ConcurrencyConfig = field(default_factory=ConcurrencyConfig)
+    contact_sheet: ContactSheetConfig = field(default_factory=ContactSheetConfig)
+    export: ExportConfig = field(default_factory=ExportConfig)
+    warmup: WarmupConfig = field(default_factory=WarmupConfig)
+    worker: WorkerConfig = field(default_factory=WorkerConfig)
+
+    def validate(self):
+        positive = {
+            "max_preview_pages": self.max_preview_pages,
+            "max_search_results": self.max_search_results,
+            "max_image_height": self.max_image_height,
+            "preview_max_width": self.preview_max_width,
+            "preview_max_height": self.preview_max_height,
+            "concurrency.api.initial_limit": self.concurrency.api.initial_limit,
+            "concurrency.api.max_limit": self.concurrency.api.max_limit,
+            "concurrency.api.timeout": self.concurrency.api.timeout,
+            "concurrency.image.initial_limit": self.concurrency.image.initial_limit,
+            "concurrency.image.max_limit": self.concurrency.image.max_limit,
+            "concurrency.image.timeout": self.concurrency.image.timeout,
+            "contact_sheet.columns": self.contact_sheet.columns,
+            "contact_sheet.cell_width": self.contact_sheet.cell_width,
+            "contact_sheet.concurrency": self.contact_sheet.concurrency,
+            "warmup.top_n": self.warmup.top_n,
+            "warmup.chapters": self.warmup.chapters,
+            "warmup.disk_budget_mb": self.warmup.disk_budget_mb,
+            "warmup.check_interval": self.warmup.check_interval,
+            "warmup.concurrency": self.warmup.concurrency,
+            "worker.processes": self.worker.processes,
+            "worker.poll_interval": self.worker.poll_interval,
+        }
+        for name, value in positive.items():
+            if value <= 0:
+                raise ConfigError(f"配置项 {name} 必须大于0")
+
+        # 以下配置项为0时表示不缓存、不限速或不监听
+        non_negative = {
+            "meta_cache_ttl": self.meta_cache_ttl,
+            "episodes_cache_ttl": self.episodes_cache_ttl,
+            "config_watch_interval": self.config_watch_interval,
+            "warmup.bandwidth_kbps": self.warmup.bandwidth_kbps,
+        }
+        for name, value in non_negative.items():
+            if value < 0:
+                raise ConfigError(f"配置项 {name} 不能为负数")
+
+        for name, limits in (("api", self.concurrency.api), ("image", self.concurrency.image)):
+            if limits.initial_limit > limits.max_limit:
+                raise ConfigError(f"配置项 concurrency.{name}.initial_limit 不能大于 concurrency.{name}.max_limit")
+
+        if self.export.format.lower() not in ("cbz", "zip", "pdf"):
+            raise ConfigError("配置项 export.format 只能是 cbz / zip / pdf")
+
+        if len(self.warmup.quiet_hours) != 2 or not all(0 <= hour <= 23 for hour in self.warmup.quiet_hours):
+            raise ConfigError("配置项 warmup.quiet_hours 应为 [起始小时, 结束小时]，取值 0~23")
+
+
+def _check_type(value, expected, name: str):
+    origin = typing.get_origin(expected)
+
+    if origin is typing.Union:
+        if value is None:
+            return None
+        expected = next(arg for arg in typing.get_args(expected) if arg is not type(None))
+        return _check_type(value, expected, name)
+
+    if origin is list:
+        if not isinstance(value, list):
+            raise ConfigError(f"配置项 {name} 应为列表")
+        item_type = typing.get_args(expected)[0]
+        return [_check_type(item, item_type, f"{name}[{i}]") for i, item in enumerate(value)]
+
+    if dataclasses.is_dataclass(expected):
+        return _build(expected, value, name)
+
+    if expected is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    if expected is str and isinstance(value, (int, float)) and not isinstance(value, bool):
+        # 账号、QQ号等在YAML中可能被写成数字
+        return str(value)
+    if expected is int and isinstance(value, bool) or not isinstance(value, expected):
+        raise ConfigError(f"配置项 {name} 类型错误，应为 {expected.__name__}，实际为 {type(value).__name__}")
+    return value
+
+
+def _build(cls, data, prefix: str = ""):
+    if data is None:
+        return cls()
+    if not isinstance(data, dict):
+        raise ConfigError(f"配置项 {prefix or '根节点'} 应为字典")
+
+    hints = typing.get_type_hints(cls)
+    unknown = [key for key in data if key not in hints]
+    if unknown:
+        # 多半是拼写错误或缩进错误，直接忽略会让用户以为配置已生效
+        names = ", ".join(f"{prefix}.{key}" if prefix else str(key) for key in unknown)
+        raise ConfigError(f"未知的配置项: {names}")
+
+    values = {}
+    for f in dataclasses.fields(cls):
+        if f.name in data:
+            values[f.name] = _check_type(data[f.name], hints[f.name], f"{prefix}.{f.name}" if prefix else f.name)
+    return cls(**values)
+
+
+def parse_config(data) -> PluginConfig:
+    config = _build(PluginConfig, data)
+    config.validate()
+    return config
+
+
+class ConfigService:
+    """统一加载和校验配置，支持文件变更监听和命令触发的热重载"""
+
+    def __init__(self, path: str = CONFIG_PATH):
+        self.path = path
+        self.current: PluginConfig = None
+        self._mtime = None
+        self._listeners: List[Callable[[PluginConfig, PluginConfig], None]] = []
+        self._watch_task: asyncio.Task = None
+
+    def load(self) -> PluginConfig:
+        """读取并校验配置文件，校验失败时保留原配置并抛出ConfigError"""
+        import yaml
+
+        mtime = os.path.getmtime(self.path)
+        with open(self.path, "r", encoding="utf-8") as f:
+            try:
+                data = yaml.safe_load(f)
+            except yaml.YAMLError as e:
+                raise ConfigError(f"配置文件格式错误: {e}")
+
+        config = parse_config(data)
+        old, self.current, self._mtime = self.current, config, mtime
+
+        for listener in list(self._listeners):
+            try:
+                listener(old, config)
+            except Exception as e:
+                print(f"应用配置变更失败: {e}")
+        return config
+
+    def get(self) -> PluginConfig:
+        if self.current is None:
+            self.load()
+        return self.current
+
+    def subscribe(self, listener: Callable[[PluginConfig, PluginConfig], None]):
+        """注册配置变更回调，参数为旧配置和新配置"""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[PluginConfig, PluginConfig], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def start_watching(self, logger=None):
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch(logger))
+
+    def stop_watching(self):
+        if self._watch_task and not self._watch_task.done():
+            self._watch_task.cancel()
+
+    async def _watch(self, logger):
+        while True:
+            interval = self.get().config_watch_interval
+            # config_watch_interval 为0时不监听文件，仍可通过命令手动重载
+            await asyncio.sleep(interval if interval > 0 else 60)
+            if interval <= 0:
+                continue
+
+            try:
+                if os.path.getmtime(self.path) == self._mtime:
+                    continue
+                self.load()
+                if logger:
+                    logger.info("检测到配置文件变更，已重新加载漫画插件配置")
+            except Exception as e:
+                # 避免同一份错误配置被反复加载报错
+                self._mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+                if logger:
+                    logger.error(f"重新加载漫画插件配置失败: {str(e)}")
+                else:
+                    print(f"重新加载漫画插件配置失败: {e}")
+
+
+config_service = ConfigService()
+
+
+def get_config() -> PluginConfig:
+    return config_service.get()
@@ -0,0 +1,132 @@
+import os
+import io
+import uuid
+import zipfile
+from typing import List, Dict, Tuple
+
+EXPORT_FORMATS = ("cbz", "zip", "pdf")
+
+
+class ComicArchiveWriter:
+    """将已缓存的页面逐章写入单个CBZ/ZIP/PDF文件，不在内存中保留全部页面"""
+
+    def __init__(self, output_path: str, fmt: str = "cbz"):
+        fmt = fmt.lower()
+        if fmt not in EXPORT_FORMATS:
+            raise Exception(f"不支持的打包格式: {fmt}，可选: {'/'.join(EXPORT_FORMATS)}")
+
+        self.fmt = fmt
+        self.output_path = output_path
+        # 临时文件名带随机后缀，同一漫画同时打包时互不覆盖
+        self.temp_path = f"{output_path}.{uuid.uuid4().hex}.part"
+        self.page_count = 0
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        if fmt == "pdf":
+            self._writer = _PdfStreamWriter(self.temp_path)
+        else:
+            # 漫画页本身已是压缩图片，直接存储不再重复压缩
+            self._writer = zipfile.ZipFile(self.temp_path, "w", compression=zipfile.ZIP_STORED)
+
+    def add_pages(self, image_paths: List[str], prefix: str):
+        for i, img_path in enumerate(image_paths):
+            if self.fmt == "pdf":
+                self._writer.add_image(img_path)
+            else:
+                ext = os.path.splitext(img_path)[1] or ".jpg"
+                self._writer.write(img_path, f"{prefix}/{i+1:04d}{ext}")
+            self.page_count += 1
+
+    def close(self) -> str:
+        self._writer.close()
+        os.replace(self.temp_path, self.output_path)
+        return self.output_path
+
+    def abort(self):
+        try:
+            self._writer.close()
+        except Exception:
+            pass
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+class _PdfStreamWriter:
+    """逐页追加写入的最小PDF实现，JPEG页面直接以DCTDecode嵌入无需重新编码"""
+
+    def __init__(self, path: str):
+        self.file = open(path, "wb")
+        self.offsets: Dict[int, int] = {}
+        self.page_ids: List[int] = []
+        # 1号对象为Catalog，2号对象为Pages，在关闭时写入
+        self.next_id = 2
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _reserve(self) -> int:
+        self.next_id += 1
+        return self.next_id
+
+    def _write_object(self, obj_id: int, body: bytes, stream: bytes = None):
+        self.offsets[obj_id] = self.file.tell()
+        self.file.write(f"{obj_id} 0 obj\n".encode())
+        self.file.write(body)
+        if stream is not None:
+            self.file.write(b"\nstream\n")
+            self.file.write(stream)
+            self.file.write(b"\nendstream")
+        self.file.write(b"\nendobj\n")
+
+    def add_image(self, img_path: str):
+        data, width, height, color_space = _load_jpeg(img_path)
+
+        image_id = self._reserve()
+        content_id = self._reserve()
+        page_id = self._reserve()
+
+        self._write_object(
+            image_id,
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace /{color_space} /BitsPerComponent 8 /Filter /DCTDecode /Length {len(data)} >>".encode(),
+            data
+        )
+
+        content = f"q {width} 0 0 {height} 0 0 cm /Im0 Do Q".encode()
+        self._write_object(content_id, f"<< /Length {len(content)} >>".encode(), content)
+
+        self._write_object(
+            page_id,
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] "
+            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>".encode()
+        )
+        self.page_ids.append(page_id)
+
+    def close(self):
+        if self.file.closed:
+            return
+
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.page_ids)
+        self._write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>".encode())
+        self._write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref_offset = self.file.tell()
+        self.file.write(f"xref\n0 {self.next_id + 1}\n".encode())
+        self.file.write(b"0000000000 65535 f \n")
+        for obj_id in range(1, self.next_id + 1):
+            self.file.write(f"{self.offsets[obj_id]:010d} 00000 n \n".encode())
+        self.file.write(f"trailer\n<< /Size {self.next_id + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+        self.file.close()
+
+
+def _load_jpeg(img_path: str) -> Tuple[bytes, int, int, str]:
+    from PIL import Image as PILImage
+
+    with PILImage.open(img_path) as img:
+        width, height = img.size
+        if img.format == "JPEG" and img.mode in ("RGB", "L"):
+            with open(img_path, "rb") as f:
+                data = f.read()
+            return data, width, height, "DeviceGray" if img.mode == "L" else "DeviceRGB"
+
+        buffer = io.BytesIO()
+        img.convert("RGB").save(buffer, "JPEG", quality=90)
+        return buffer.getvalue(), width, height, "DeviceRGB"
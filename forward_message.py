@@ -1,27 +1,22 @@
 import os
 import json
-import aiohttp
-import yaml
+import asyncio
+import hashlib
 from typing import List, Dict, Any
-from PIL import Image as PILImage
 from pkg.platform.types.message import MessageChain, Plain, Image, ForwardMessageNode, ForwardMessageDiaplay, Forward
+from .config import get_config
 
-config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "yaml", "config.yaml")
-with open(config_path, "r", encoding="utf-8") as f:
-    config = yaml.safe_load(f)
 
-FORWARD_CONFIG = config.get("forward", {})
-SENDER_NAME = FORWARD_CONFIG.get("sender_name", "漫画")
-SENDER_ID = FORWARD_CONFIG.get("sender_id", "3870128501")
-MAX_PREVIEW_PAGES = config.get("max_preview_pages", 10)
-MAX_IMAGE_HEIGHT = config.get("max_image_height", 20000)
-
-
-async def merge_images(image_paths: List[str], max_height: int = MAX_IMAGE_HEIGHT) -> List[str]:
+async def merge_images(image_paths: List[str], max_height: int = None) -> List[str]:
 
     if not image_paths:
         return []
 
+    if max_height is None:
+        max_height = get_config().max_image_height
+
+    from PIL import Image as PILImage
+
     output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pica_plugin", "cache", "merged")
     os.makedirs(output_dir, exist_ok=True)
 
@@ -80,9 +75,13 @@ async def _merge_batch(batch: List[tuple], output_dir: str, batch_number: int) -
     if not batch:
         return None
     
+    from PIL import Image as PILImage
+
     _, first_path = batch[0]
     basename = os.path.basename(first_path)
-    output_path = os.path.join(output_dir, f"merged_{batch_number}_{basename}")
+    # 同一漫画各章节的页面文件名相同，用章节目录名区分，避免并行下载的章节互相覆盖
+    chapter = os.path.basename(os.path.dirname(first_path))
+    output_path = os.path.join(output_dir, f"merged_{chapter}_{batch_number}_{basename}")
     
     try:
         images = [img for img, _ in batch]
@@ -106,25 +105,144 @@ async def _merge_batch(batch: List[tuple], output_dir: str, batch_number: int) -
         return path
 
 
+async def build_preview_image(image_paths: List[str], max_width: int = None, max_height: int = None) -> str:
+    """只解码开头几页生成限定尺寸的预览图，避免为单张预览合并整个章节"""
+    config = get_config()
+    max_width = max_width or config.preview_max_width
+    max_height = max_height or config.preview_max_height
+    local_paths = [path for path in image_paths if not path.startswith(('http://', 'https://'))]
+    if not local_paths:
+        return None
+
+    return await asyncio.to_thread(_render_preview, local_paths, max_width, max_height)
+
+
+def _render_preview(image_paths: List[str], max_width: int, max_height: int) -> str:
+    from PIL import Image as PILImage
+
+    output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "preview")
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 缓存键包含所有可能用到的页面及其修改时间和大小，任一页面重新下载后都会重新生成
+    key = [f"{max_width}x{max_height}"]
+    for img_path in image_paths:
+        try:
+            stat = os.stat(img_path)
+            key.append(f"{os.path.abspath(img_path)}:{stat.st_mtime_ns}:{stat.st_size}")
+        except OSError:
+            key.append(f"{os.path.abspath(img_path)}:missing")
+    digest = hashlib.md5("|".join(key).encode()).hexdigest()[:16]
+    output_path = os.path.join(output_dir, f"preview_{digest}.jpg")
+    if os.path.exists(output_path):
+        return output_path
+
+    pages = []
+    total_height = 0
+    for img_path in image_paths:
+        if total_height >= max_height:
+            break
+
+        try:
+            with PILImage.open(img_path) as img:
+                # JPEG按不小于目标尺寸的1/2、1/4、1/8分辨率直接解码，页面宽度至少为预览宽度2倍时才会生效
+                scale = min(max_width / img.width, max_height / img.height, 1)
+                img.draft("RGB", (int(img.width * scale), int(img.height * scale)))
+                # draft()已完成粗缩放，thumbnail不再按reducing_gap放宽解码尺寸
+                img.thumbnail((max_width, max_height), reducing_gap=None)
+                page = img.convert("RGB")
+        except Exception as e:
+            print(f"打开图片失败: {img_path}, 错误: {e}")
+            continue
+
+        if total_height + page.height > max_height:
+            page = page.crop((0, 0, page.width, max_height - total_height))
+
+        pages.append(page)
+        total_height += page.height
+
+    if not pages:
+        return None
+
+    width = max(page.width for page in pages)
+    preview = PILImage.new("RGB", (width, total_height), (255, 255, 255))
+
+    y_offset = 0
+    for page in pages:
+        preview.paste(page, ((width - page.width) // 2, y_offset))
+        y_offset += page.height
+
+    preview.save(output_path, "JPEG", quality=85)
+    return output_path
+
+
+async def build_contact_sheet(cover_paths: List[str], columns: int = 5, cell_width: int = 200) -> str:
+    """将搜索结果封面按序号拼成一张缩略图总览"""
+    if not any(cover_paths):
+        return None
+
+    return await asyncio.to_thread(_render_contact_sheet, cover_paths, max(1, columns), cell_width)
+
+
+def _render_contact_sheet(cover_paths: List[str], columns: int, cell_width: int) -> str:
+    from PIL import Image as PILImage, ImageDraw
+
+    output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "contact")
+    os.makedirs(output_dir, exist_ok=True)
+
+    digest = hashlib.md5(f"{'|'.join(path or '' for path in cover_paths)}:{columns}x{cell_width}".encode()).hexdigest()[:16]
+    output_path = os.path.join(output_dir, f"contact_{digest}.jpg")
+    if os.path.exists(output_path):
+        return output_path
+
+    cell_height = cell_width * 4 // 3
+    rows = (len(cover_paths) + columns - 1) // columns
+    sheet = PILImage.new("RGB", (columns * cell_width, rows * cell_height), (255, 255, 255))
+    draw = ImageDraw.Draw(sheet)
+
+    for i, cover_path in enumerate(cover_paths):
+        left = (i % columns) * cell_width
+        top = (i // columns) * cell_height
+
+        if cover_path:
+            try:
+                with PILImage.open(cover_path) as img:
+                    img.thumbnail((cell_width, cell_height))
+                    cover = img.convert("RGB")
+                sheet.paste(cover, (left + (cell_width - cover.width) // 2, top + (cell_height - cover.height) // 2))
+            except Exception as e:
+                print(f"打开封面失败: {cover_path}, 错误: {e}")
+        else:
+            draw.rectangle((left, top, left + cell_width - 1, top + cell_height - 1), fill=(220, 220, 220))
+
+        draw.rectangle((left, top, left + 28, top + 18), fill=(0, 0, 0))
+        draw.text((left + 4, top + 3), str(i + 1), fill=(255, 255, 255))
+
+    sheet.save(output_path, "JPEG", quality=85)
+    return output_path
+
+
 class ForwardMessageBuilder:
     
     def __init__(self, host: str = "127.0.0.1", port: int = 3000):
         self.url = f"http://{host}:{port}"
     
-    async def send(self, target_type: str, target_id: str, comic_info: Dict[str, Any], images: List[str]):
+    async def send(self, target_type: str, target_id: str, comic_info: Dict[str, Any], images: List[str], merged_image_paths: List[str] = None):
 
         comic_data = comic_info.get("data", {}).get("comic", {})
         title = comic_data.get("title", "未知标题")
         comic_id = comic_data.get("_id", "")
         description = comic_data.get("description", "无简介")
+        config = get_config()
+        sender_id = config.forward.sender_id
+        sender_name = config.forward.sender_name
         
         messages = []
         
         messages.append({
             "type": "node",
             "data": {
-                "user_id": SENDER_ID,
-                "nickname": SENDER_NAME,
+                "user_id": sender_id,
+                "nickname": sender_name,
                 "content": [
                     {
                         "type": "text",
@@ -136,7 +254,8 @@ class ForwardMessageBuilder:
             }
         })
         
-        merged_image_paths = await merge_images(images)
+        if merged_image_paths is None:
+            merged_image_paths = await merge_images(images)
         
         if merged_image_paths:
             for i, merged_path in enumerate(merged_image_paths):
@@ -145,8 +264,8 @@ class ForwardMessageBuilder:
                 messages.append({
                     "type": "node",
                     "data": {
-                        "user_id": SENDER_ID,
-                        "nickname": SENDER_NAME,
+                        "user_id": sender_id,
+                        "nickname": sender_name,
                         "content": [
                             {
                                 "type": "text",
@@ -164,7 +283,7 @@ class ForwardMessageBuilder:
                     }
                 })
         else:
-            for i, img_path in enumerate(images[:MAX_PREVIEW_PAGES]):
+            for i, img_path in enumerate(images[:config.max_preview_pages]):
                 if img_path.startswith(('http://', 'https://')):
                     image_file = img_path
                 else:
@@ -173,8 +292,8 @@ class ForwardMessageBuilder:
                 messages.append({
                     "type": "node",
                     "data": {
-                        "user_id": SENDER_ID,
-                        "nickname": SENDER_NAME,
+                        "user_id": sender_id,
+                        "nickname": sender_name,
                         "content": [
                             {
                                 "type": "text",
@@ -197,7 +316,7 @@ class ForwardMessageBuilder:
         if target_type == "group":
             message_data = {
                 "group_id": target_id,
-                "user_id": SENDER_ID,
+                "user_id": sender_id,
                 "messages": messages,
                 "news": [
                     {
@@ -229,6 +348,7 @@ class ForwardMessageBuilder:
         }
         payload = json.dumps(message_data)
         try:
+            import aiohttp
             async with aiohttp.ClientSession(self.url, headers=headers) as session:
                 async with session.post(endpoint, data=payload) as response:
                     return await response.json()
@@ -236,6 +356,36 @@ class ForwardMessageBuilder:
             print(f"发送合并转发消息失败: {str(e)}")
             return None
     
+    async def upload_file(self, target_type: str, target_id: str, file_path: str, name: str):
+        
+        if target_type == "group":
+            message_data = {
+                "group_id": target_id,
+                "file": os.path.abspath(file_path),
+                "name": name
+            }
+            endpoint = "/upload_group_file"
+        else:
+            message_data = {
+                "user_id": target_id,
+                "file": os.path.abspath(file_path),
+                "name": name
+            }
+            endpoint = "/upload_private_file"
+        
+        headers = {
+            'Content-Type': 'application/json'
+        }
+        payload = json.dumps(message_data)
+        try:
+            import aiohttp
+            async with aiohttp.ClientSession(self.url, headers=headers) as session:
+                async with session.post(endpoint, data=payload) as response:
+                    return await response.json()
+        except Exception as e:
+            print(f"上传文件失败: {str(e)}")
+            return None
+    
     def get_media_path(self, media_path):
         if media_path:
             if media_path.startswith('http'):
@@ -246,28 +396,32 @@ class ForwardMessageBuilder:
         return ''
 
 
-async def build_forward_message(comic_info: Dict[str, Any], images: List[str]) -> MessageChain:
+async def build_forward_message(comic_info: Dict[str, Any], images: List[str], merged_image_paths: List[str] = None) -> MessageChain:
 
     comic_data = comic_info.get("data", {}).get("comic", {})
     title = comic_data.get("title", "未知标题")
     comic_id = comic_data.get("_id", "")
     description = comic_data.get("description", "无简介")
+    config = get_config()
+    sender_id = config.forward.sender_id
+    sender_name = config.forward.sender_name
     
     nodes = []
     
     info_text = f"标题：{title}\nID：{comic_id}\n简介：{description}\n"
     info_node = ForwardMessageNode(
-        sender_id=SENDER_ID,
-        sender_name=SENDER_NAME,
+        sender_id=sender_id,
+        sender_name=sender_name,
         message_chain=MessageChain([Plain(info_text)])
     )
     nodes.append(info_node)
     
-    try:
-        merged_image_paths = await merge_images(images)
-    except Exception as e:
-        print(f"合并图片失败: {e}")
-        merged_image_paths = None
+    if merged_image_paths is None:
+        try:
+            merged_image_paths = await merge_images(images)
+        except Exception as e:
+            print(f"合并图片失败: {e}")
+            merged_image_paths = None
     
     if merged_image_paths:
         for i, merged_path in enumerate(merged_image_paths):
@@ -275,13 +429,13 @@ async def build_forward_message(comic_info: Dict[str, Any], images: List[str]) -
             components.append(Image(path=os.path.abspath(merged_path)))
             
             node = ForwardMessageNode(
-                sender_id=SENDER_ID,
-                sender_name=SENDER_NAME,
+                sender_id=sender_id,
+                sender_name=sender_name,
                 message_chain=MessageChain(components)
             )
             nodes.append(node)
     else:
-        for i, img_path in enumerate(images[:MAX_PREVIEW_PAGES]):
+        for i, img_path in enumerate(images[:config.max_preview_pages]):
             components = [Plain(f"第{i+1}页")]
             
             if img_path.startswith(('http://', 'https://')):
@@ -290,8 +444,8 @@ async def build_forward_message(comic_info: Dict[str, Any], images: List[str]) -
                 components.append(Image(path=os.path.abspath(img_path)))
             
             node = ForwardMessageNode(
-                sender_id=SENDER_ID,
-                sender_name=SENDER_NAME,
+                sender_id=sender_id,
+                sender_name=sender_name,
                 message_chain=MessageChain(components)
             )
             nodes.append(node)
@@ -311,7 +465,7 @@ async def build_forward_message(comic_info: Dict[str, Any], images: List[str]) -
     return MessageChain([forward])
 
 
-async def build_message_chain(comic_info: Dict[str, Any], images: List[str]) -> MessageChain:
+async def build_message_chain(comic_info: Dict[str, Any], images: List[str], merged_image_paths: List[str] = None) -> MessageChain:
 
     comic_data = comic_info.get("data", {}).get("comic", {})
     title = comic_data.get("title", "未知标题")
@@ -323,27 +477,25 @@ async def build_message_chain(comic_info: Dict[str, Any], images: List[str]) ->
     components = [Plain(text)]
 
     if images:
-        try:
-            merged_image_paths = await merge_images(images)
-        except Exception as e:
-            print(f"在build_message_chain中合并图片失败: {e}")
-            merged_image_paths = None
-            
         if merged_image_paths:
             img_path = merged_image_paths[0]
             components.append(Plain(f"\n[注意] 成功合并{len(merged_image_paths)}组图片，仅预览第一组"))
-            
-            if img_path.startswith(('http://', 'https://')):
-                components.append(Image(url=img_path))
-            else:
-                components.append(Image(path=os.path.abspath(img_path)))
         else:
-            img_path = images[0]
-            components.append(Plain("\n[注意] 图片未合并，仅预览第一张"))
+            try:
+                img_path = await build_preview_image(images)
+            except Exception as e:
+                print(f"在build_message_chain中生成预览图失败: {e}")
+                img_path = None
             
-            if img_path.startswith(('http://', 'https://')):
-                components.append(Image(url=img_path))
+            if img_path:
+                components.append(Plain("\n[注意] 仅预览开头部分页面"))
             else:
-                components.append(Image(path=os.path.abspath(img_path)))
+                img_path = images[0]
+                components.append(Plain("\n[注意] 图片未合并，仅预览第一张"))
+        
+        if img_path.startswith(('http://', 'https://')):
+            components.append(Image(url=img_path))
+        else:
+            components.append(Image(path=os.path.abspath(img_path)))
     
-    return MessageChain(components) 
\ No newline at end of file
+    return MessageChain(components)
@@ -1,87 +1,181 @@
 import os
 import re
-import yaml
+import json
+import time
+import uuid
+import asyncio
+from contextlib import nullcontext
+from dataclasses import asdict
 from typing import List, Dict, Any, Tuple
 from .pica_client import PicaClient
-
-config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "yaml", "config.yaml")
-with open(config_path, "r", encoding="utf-8") as f:
-    config = yaml.safe_load(f)
-
-PICA_ACCOUNT = config.get("account", "")
-PICA_PASSWORD = config.get("password", "")
-PROXY = config.get("proxy")
-MAX_PREVIEW_PAGES = config.get("max_preview_pages", 10)
+from .config import config_service, get_config, PluginConfig
 
 CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
-os.makedirs(CACHE_DIR, exist_ok=True)
+COVER_DIR = os.path.join(CACHE_DIR, "covers")
+META_DIR = os.path.join(CACHE_DIR, "meta")
 
 FILENAME_PATTERN = r"[\\\/\:\*\?\"\<\>\|]"
 
-client = PicaClient(proxy=PROXY)
+_client: PicaClient = None
+
+def get_client() -> PicaClient:
+    """首次使用时才按当前配置创建client"""
+    global _client
+    if _client is None:
+        config = get_config()
+        _client = PicaClient(
+            proxy=config.proxy or None,
+            api_limits=asdict(config.concurrency.api),
+            image_limits=asdict(config.concurrency.image)
+        )
+    return _client
+
+def _apply_config(old: PluginConfig, new: PluginConfig):
+    """配置热重载时就地更新client，不打断进行中的下载"""
+    if _client is None:
+        return
+    
+    client = _client
+    client.proxy = new.proxy or None
+    client.configure_limits(asdict(new.concurrency.api), asdict(new.concurrency.image))
+    
+    if old and (old.account, old.password) != (new.account, new.password):
+        client.is_login = False
+
+config_service.subscribe(_apply_config)
 
 async def login():
-    if not PICA_ACCOUNT or not PICA_PASSWORD:
+    config = get_config()
+    client = get_client()
+    if not config.account or not config.password:
         raise Exception("请在plugins\\pica_plugin\\yaml\\config.yaml配置账号密码")
     
-    if not client.is_login and PICA_ACCOUNT and PICA_PASSWORD:
+    if not client.is_login and config.account and config.password:
         try:
-            await client.login(PICA_ACCOUNT, PICA_PASSWORD)
+            await client.login(config.account, config.password)
             return True
         except Exception as e:
             raise Exception(f"登录哔咔账号失败: {str(e)}")
     return client.is_login
 
-async def search_comics(keyword: str, page: int = 1) -> Dict[str, Any]:
+async def _cached_meta(name: str, fetch, ttl: int = None) -> Dict[str, Any]:
+    """接口返回的元数据缓存到本地文件，有效期内不再请求接口，未指定有效期时使用meta_cache_ttl"""
+    cache_path = os.path.join(META_DIR, f"{name}.json")
+    if ttl is None:
+        ttl = get_config().meta_cache_ttl
+    
+    if ttl > 0 and os.path.exists(cache_path) and time.time() - os.path.getmtime(cache_path) < ttl:
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"读取元数据缓存失败: {cache_path}, 错误: {e}")
+    
+    response = await fetch()
+    
+    if ttl > 0 and response.get("data"):
+        os.makedirs(META_DIR, exist_ok=True)
+        # 多个下载进程可能同时写入同一条元数据，各自使用独立的临时文件
+        temp_path = f"{cache_path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(response, f, ensure_ascii=False)
+            os.replace(temp_path, cache_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    return response
+
+async def search_comics(keyword: str, page: int = 1, sort: str = PicaClient.Order_Default) -> Dict[str, Any]:
+    if not await login():
+        raise Exception("哔咔账号未登录，请检查配置")
+    
+    response = await get_client().search(keyword, sort=sort, page=page)
+    return response
+
+async def list_comics(category: str = None, sort: str = PicaClient.Order_Default, page: int = 1) -> Dict[str, Any]:
     if not await login():
         raise Exception("哔咔账号未登录，请检查配置")
     
-    response = await client.search(keyword, page=page)
+    response = await get_client().comics(category=category, sort=sort, page=page)
     return response
 
 async def get_comic_info(comic_id: str) -> Dict[str, Any]:
     if not await login():
         raise Exception("哔咔账号未登录，请检查配置")
     
-    comic_info = await client.comic_info(comic_id)
+    comic_info = await _cached_meta(f"{comic_id}-info", lambda: get_client().comic_info(comic_id))
     return comic_info
 
 async def get_comic_episodes(comic_id: str) -> Dict[str, Any]:
     if not await login():
         raise Exception("哔咔账号未登录，请检查配置")
     
-    episode_info = await client.episodes(comic_id)
+    # 连载中的漫画会更新章节，章节列表使用较短的缓存有效期
+    episode_info = await _cached_meta(
+        f"{comic_id}-eps", lambda: get_client().episodes(comic_id), get_config().episodes_cache_ttl
+    )
     return episode_info
 
-async def download_comic_images(comic_id: str, ep: int, safe_title: str) -> Tuple[List[str], int]:
+def get_media_url(media: Dict[str, Any]) -> str:
+    return media.get("orig") or media.get("fileServer") + "/static/" + media.get("path")
+
+async def download_covers(comics: List[Dict[str, Any]], concurrency: int = 4) -> List[str]:
+    """并发下载搜索结果封面，按漫画ID缓存，下载失败的位置返回None"""
+    os.makedirs(COVER_DIR, exist_ok=True)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def fetch(comic: Dict[str, Any]) -> str:
+        comic_id = comic.get("_id", "")
+        thumb = comic.get("thumb") or {}
+        if not comic_id or not (thumb.get("orig") or thumb.get("path")):
+            return None
+        
+        cover_path = os.path.join(COVER_DIR, f"{comic_id}.jpg")
+        if os.path.exists(cover_path):
+            return cover_path
+        
+        async with semaphore:
+            success = await get_client().download_image(get_media_url(thumb), cover_path)
+        return cover_path if success else None
+    
+    return await asyncio.gather(*(fetch(comic) for comic in comics))
+
+def get_chapter_dir(safe_title: str, ep: int) -> str:
+    return os.path.join(CACHE_DIR, safe_title, f"ep{ep}")
+
+async def download_comic_images(comic_id: str, ep: int, safe_title: str, throttle=None) -> Tuple[List[str], int]:
+    """下载章节全部页面，throttle用于缓存预热等需要限制带宽的场景"""
     if not await login():
         raise Exception("哔咔账号未登录，请检查配置")
     
-    comic_dir = os.path.join(CACHE_DIR, safe_title)
+    comic_dir = get_chapter_dir(safe_title, ep)
     os.makedirs(comic_dir, exist_ok=True)
     
-    picture_info = await client.picture(comic_id, ep)
+    picture_info = await _cached_meta(f"{comic_id}-ep{ep}-pages", lambda: get_client().picture(comic_id, ep))
     pages = picture_info.get("data", {}).get("pages", {}).get("docs", [])
     
     if not pages:
         raise Exception("未找到图片信息")
     
     total_pages = len(pages)
-    downloaded_images = []
     
-    for i, page in enumerate(pages):
-        media = page.get("media", {})
-        image_url = media.get("orig") or media.get("fileServer") + "/static/" + media.get("path")
-        
+    # 并发下载，实际并发数由client的自适应限制器控制
+    async def fetch(i: int, page: Dict[str, Any]) -> str:
         image_path = os.path.join(comic_dir, f"{safe_title}-{i+1}.jpg")
         
         if os.path.exists(image_path):
-            downloaded_images.append(image_path)
-            continue
+            return image_path
         
-        success = await client.download_image(image_url, image_path)
-        if success:
-            downloaded_images.append(image_path)
+        async with throttle.slot() if throttle else nullcontext():
+            success = await get_client().download_image(get_media_url(page.get("media", {})), image_path)
+        if success and throttle:
+            throttle.consume(os.path.getsize(image_path))
+        return image_path if success else None
+    
+    results = await asyncio.gather(*(fetch(i, page) for i, page in enumerate(pages)))
+    downloaded_images = [image_path for image_path in results if image_path]
     
     if not downloaded_images:
         raise Exception("未能下载任何图片，请检查网络连接或考虑配置代理服务器")
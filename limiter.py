@@ -0,0 +1,173 @@
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any
+
+
+class RequestRejected(Exception):
+    """服务端明确拒绝的请求（如400/401/404），计入失败率但不视为拥塞，不收缩并发"""
+    pass
+
+
+class EndpointStats:
+    """单个接口最近一段时间内的延迟和失败情况"""
+
+    def __init__(self, window: int = 100):
+        self.latencies = deque(maxlen=window)
+        self.errors = deque(maxlen=window)
+        self.timeouts = deque(maxlen=window)
+        self.total = 0
+
+    def record(self, latency: float, error: bool, timed_out: bool):
+        self.latencies.append(latency)
+        self.errors.append(1 if error else 0)
+        self.timeouts.append(1 if timed_out else 0)
+        self.total += 1
+
+    def percentile(self, q: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[int(q * (len(ordered) - 1))]
+
+    @property
+    def error_rate(self) -> float:
+        return sum(self.errors) / len(self.errors) if self.errors else 0.0
+
+    @property
+    def timeout_rate(self) -> float:
+        return sum(self.timeouts) / len(self.timeouts) if self.timeouts else 0.0
+
+
+class AdaptiveLimiter:
+    """AIMD并发限制器
+
+    请求成功且延迟正常时每轮加一个并发，超时或失败时并发减半，
+    延迟明显高于中位数时小幅收缩。超时时间按各接口p99延迟自动调整。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        timeout: float = 30,
+        min_timeout: float = 5,
+        max_timeout: float = 120,
+        timeout_multiplier: float = 3.0,
+        latency_tolerance: float = 2.0,
+        window: int = 100,
+    ):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.default_timeout = timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.latency_tolerance = latency_tolerance
+        self.window = window
+        self.in_flight = 0
+        self.endpoints: Dict[str, EndpointStats] = {}
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    def configure(self, max_limit: int = None, timeout: float = None, **_):
+        """运行中调整上限和默认超时，保留已有的统计数据和当前并发"""
+        if max_limit is not None:
+            self.max_limit = max(self.min_limit, max_limit)
+            self.limit = min(self.limit, self.max_limit)
+        if timeout is not None:
+            self.default_timeout = timeout
+
+    def _stats(self, endpoint: str) -> EndpointStats:
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = EndpointStats(self.window)
+        return self.endpoints[endpoint]
+
+    def timeout_for(self, endpoint: str) -> float:
+        stats = self.endpoints.get(endpoint)
+        if not stats or len(stats.latencies) < 20:
+            return self.default_timeout
+        timeout = stats.percentile(0.99) * self.timeout_multiplier
+        return min(max(timeout, self.min_timeout), self.max_timeout)
+
+    @asynccontextmanager
+    async def acquire(self, endpoint: str):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+        start = time.monotonic()
+        error = True
+        congestion = True
+        timed_out = False
+        cancelled = False
+        try:
+            yield self.timeout_for(endpoint)
+            error = False
+        except RequestRejected:
+            congestion = False
+            raise
+        except (TimeoutError, asyncio.TimeoutError):
+            timed_out = True
+            raise
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            latency = time.monotonic() - start
+            if timed_out:
+                # 超时请求按当前超时时间计入，使超时时间在持续超时时逐步放宽
+                latency = max(latency, self.timeout_for(endpoint))
+            if not cancelled:
+                self._record(endpoint, latency, error, timed_out, congestion)
+
+            self.in_flight -= 1
+            async with self._condition:
+                self._condition.notify_all()
+
+    def _record(self, endpoint: str, latency: float, error: bool, timed_out: bool, congestion: bool = True):
+        stats = self._stats(endpoint)
+        median = stats.percentile(0.5)
+        stats.record(latency, error, timed_out)
+
+        if error and not congestion:
+            # 参数错误、登录过期等与服务端负载无关，并发保持不变
+            return
+        if error:
+            self._decrease(0.5, median)
+        elif len(stats.latencies) >= 10 and median and latency > median * self.latency_tolerance:
+            self._decrease(0.9, median)
+        else:
+            self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+
+    def _decrease(self, factor: float, median: float):
+        # 同一轮内的并发失败只收缩一次，避免限制被瞬间压到最低
+        now = time.monotonic()
+        if now - self._last_decrease < max(median, 1.0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.limit * factor, self.min_limit)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "endpoints": {
+                endpoint: {
+                    "p50": round(stats.percentile(0.5), 3),
+                    "p90": round(stats.percentile(0.9), 3),
+                    "p99": round(stats.percentile(0.99), 3),
+                    "error_rate": round(stats.error_rate, 3),
+                    "timeout_rate": round(stats.timeout_rate, 3),
+                    "timeout": round(self.timeout_for(endpoint), 1),
+                    "samples": stats.total,
+                }
+                for endpoint, stats in self.endpoints.items()
+            },
+        }
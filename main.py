@@ -1,18 +1,26 @@
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
 import os
+import re
+import uuid
 import asyncio
-import yaml
+import importlib
 from typing import List
 from pkg.plugin.context import register, handler, BasePlugin, APIHost, EventContext
 from pkg.plugin.events import PersonNormalMessageReceived, GroupNormalMessageReceived
 from pkg.platform.types.message import MessageChain, Plain, Image
-from plugins.pica_plugin.get_image import get_pica_images, search_comics, get_comic_episodes
-from plugins.pica_plugin.forward_message import ForwardMessageBuilder, build_message_chain, build_forward_message
+from plugins.pica_plugin.get_image import get_pica_images, search_comics, get_comic_episodes, get_comic_info, download_covers, FILENAME_PATTERN, get_client, login
+from plugins.pica_plugin.forward_message import ForwardMessageBuilder, build_message_chain, build_forward_message, build_contact_sheet
+from plugins.pica_plugin.worker import WorkerPool, WorkerPoolClosed
+from plugins.pica_plugin.exporter import ComicArchiveWriter, EXPORT_FORMATS
+from plugins.pica_plugin.warmer import CacheWarmer
+from plugins.pica_plugin.config import config_service, get_config, PluginConfig
 
-config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "yaml", "config.yaml")
-with open(config_path, "r", encoding="utf-8") as f:
-    config = yaml.safe_load(f)
+_IMPORT_FINISHED = time.perf_counter()
 
-MAX_SEARCH_RESULTS = config.get("max_search_results", 10)
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "export")
 
 
 @register(name="看漫画",description="漫画搜索和下载查看插件",version="0.1",author="小馄饨")
@@ -23,10 +31,76 @@ class PicaPlugin(BasePlugin):
     def __init__(self, host: APIHost):
         super().__init__(host)
         self.forward_message = ForwardMessageBuilder(host="127.0.0.1", port=3000)
+        self.worker_pool = None
+        self.cache_warmer = None
+        self.warm_up_task = None
+        self.config_tasks = set()
+        self.startup_timings = {}
     
     async def initialize(self):
+        initialize_started = time.perf_counter()
+        # 宿主导入插件后到调用initialize之间的等待不计入插件耗时
+        self.startup_timings["模块导入"] = (_IMPORT_FINISHED - _IMPORT_STARTED) * 1000
+        
         cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
         os.makedirs(cache_dir, exist_ok=True)
+        
+        await self._apply_config(get_config())
+        config_service.subscribe(self._on_config_changed)
+        config_service.start_watching(self.ap.logger)
+        
+        self.startup_timings["初始化"] = (time.perf_counter() - initialize_started) * 1000
+        self.warm_up_task = asyncio.create_task(self._warm_up(initialize_started))
+    
+    async def _warm_up(self, initialize_started: float):
+        """后台预加载图片处理和网络依赖并登录，不阻塞插件注册"""
+        try:
+            await asyncio.to_thread(importlib.import_module, "PIL.Image")
+            await asyncio.to_thread(importlib.import_module, "aiohttp")
+            await login()
+            self.startup_timings["初始化到登录就绪"] = (time.perf_counter() - initialize_started) * 1000
+            self.ap.logger.info(
+                f"漫画插件就绪，模块导入 {self.startup_timings['模块导入']:.0f}ms，"
+                f"初始化 {self.startup_timings['初始化']:.0f}ms，"
+                f"初始化到登录就绪 {self.startup_timings['初始化到登录就绪']:.0f}ms"
+            )
+        except Exception as e:
+            self.ap.logger.warning(f"漫画插件后台预热失败，将在首次使用时重试: {str(e)}")
+    
+    def _on_config_changed(self, old: PluginConfig, new: PluginConfig):
+        # 保留任务引用，避免任务在执行中被回收
+        task = asyncio.create_task(self._apply_config(new))
+        self.config_tasks.add(task)
+        task.add_done_callback(self.config_tasks.discard)
+    
+    async def _apply_config(self, config: PluginConfig):
+        """按当前配置启停或就地调整下载进程和缓存预热，不影响进行中的下载"""
+        try:
+            if config.worker.enabled:
+                if self.worker_pool:
+                    await self.worker_pool.resize(config.worker.processes, config.worker.poll_interval)
+                else:
+                    self.worker_pool = WorkerPool(
+                        processes=config.worker.processes,
+                        poll_interval=config.worker.poll_interval
+                    )
+                    await self.worker_pool.start()
+            elif self.worker_pool:
+                # 先摘下引用再等待进程退出，进行中的章节会改为在插件进程内下载
+                worker_pool, self.worker_pool = self.worker_pool, None
+                await worker_pool.stop()
+            
+            if config.warmup.enabled:
+                if self.cache_warmer:
+                    self.cache_warmer.configure(config.warmup)
+                else:
+                    self.cache_warmer = CacheWarmer(config.warmup, self.ap.logger)
+                self.cache_warmer.start()
+            elif self.cache_warmer:
+                self.cache_warmer.stop()
+                self.cache_warmer = None
+        except Exception as e:
+            self.ap.logger.error(f"应用漫画插件配置失败: {str(e)}")
     
     @handler(PersonNormalMessageReceived)
     async def person_message_received(self, ctx: EventContext):
@@ -43,6 +117,14 @@ class PicaPlugin(BasePlugin):
         elif msg == "漫画帮助":
             ctx.prevent_default()
             await self._show_help(ctx)
+        
+        elif msg == "漫画状态":
+            ctx.prevent_default()
+            await self._show_status(ctx)
+        
+        elif msg == "漫画重载配置":
+            ctx.prevent_default()
+            await self._reload_config(ctx)
     
     @handler(GroupNormalMessageReceived)
     async def group_message_received(self, ctx: EventContext):
@@ -59,6 +141,14 @@ class PicaPlugin(BasePlugin):
         elif msg == "漫画帮助":
             ctx.prevent_default()
             await self._show_help(ctx)
+        
+        elif msg == "漫画状态":
+            ctx.prevent_default()
+            await self._show_status(ctx)
+        
+        elif msg == "漫画重载配置":
+            ctx.prevent_default()
+            await self._reload_config(ctx)
     
     async def _search_comics(self, ctx: EventContext, msg: str):
         parts = msg.split()
@@ -90,8 +180,9 @@ class PicaPlugin(BasePlugin):
                 await ctx.reply(MessageChain([Plain(f"未找到关键词 '{keyword}' 相关的漫画(第{page}页)")]))
                 return
             
+            config = get_config()
             result_message = [f"搜索结果(第{page}页)："]
-            for i, comic in enumerate(comics[:MAX_SEARCH_RESULTS]):
+            for i, comic in enumerate(comics[:config.max_search_results]):
                 title = comic.get("title", "未知标题")
                 id = comic.get("_id", "")
                 description = comic.get("description", "无简介")
@@ -106,10 +197,28 @@ class PicaPlugin(BasePlugin):
             
             await ctx.reply(MessageChain([Plain("\n".join(result_message))]))
             
+            if config.contact_sheet.enabled:
+                await self._send_contact_sheet(ctx, comics[:config.max_search_results])
+            
         except Exception as e:
             self.ap.logger.error(f"搜索漫画失败: {str(e)}")
             await ctx.reply(MessageChain([Plain(f"搜索失败: {str(e)}")]))
     
+    async def _send_contact_sheet(self, ctx: EventContext, comics: list):
+        """发送搜索结果的封面拼图，失败时不影响文字结果"""
+        settings = get_config().contact_sheet
+        try:
+            cover_paths = await download_covers(comics, settings.concurrency)
+            sheet_path = await build_contact_sheet(
+                cover_paths,
+                columns=settings.columns,
+                cell_width=settings.cell_width
+            )
+            if sheet_path:
+                await ctx.reply(MessageChain([Image(path=os.path.abspath(sheet_path))]))
+        except Exception as e:
+            self.ap.logger.warning(f"生成封面拼图失败: {str(e)}")
+    
     async def _download_comic(self, ctx: EventContext, msg: str):
         """下载漫画"""
         parts = msg.split()
@@ -119,11 +228,27 @@ class PicaPlugin(BasePlugin):
         
         comic_id = parts[1]
         
+        export_config = get_config().export
+        export_format = None
+        if len(parts) >= 3 and parts[2] == "打包":
+            export_format = parts[3].lower() if len(parts) >= 4 else export_config.format.lower()
+        elif export_config.default:
+            export_format = export_config.format.lower()
+        
+        if export_format and export_format not in EXPORT_FORMATS:
+            await ctx.reply(MessageChain([Plain(f"不支持的打包格式：{export_format}，可选：{'/'.join(EXPORT_FORMATS)}")]))
+            return
+        
         await ctx.reply(MessageChain([Plain(f"正在获取漫画信息，请稍候...")]))
         
-        download_task = asyncio.create_task(
-            self._process_download_all(ctx, comic_id)
-        )
+        if export_format:
+            download_task = asyncio.create_task(
+                self._process_export(ctx, comic_id, export_format)
+            )
+        else:
+            download_task = asyncio.create_task(
+                self._process_download_all(ctx, comic_id)
+            )
         self.download_tasks.append(download_task)
         
         self._clean_finished_tasks()
@@ -140,36 +265,33 @@ class PicaPlugin(BasePlugin):
             total_eps = len(episodes)
             await ctx.reply(MessageChain([Plain(f"漫画共有 {total_eps} 章，开始下载全部章节，请耐心等待...")]))
             
-            for ep in range(1, total_eps + 1):
+            async for ep, chapter, error in self._iter_chapters(comic_id, total_eps):
                 try:
-                    comic_info, images, title = await get_pica_images(comic_id, ep)
+                    if error:
+                        raise error
+                    comic_info, images, title, merged_images = chapter
                     
                     await ctx.reply(MessageChain([
                         Plain(f"第{ep}章下载完成: '{title}'，共{len(images)}页，正在发送...")
                     ]))
                     
-                    if isinstance(ctx.event, GroupNormalMessageReceived):
-                        target_type = "group"
-                        target_id = str(ctx.event.launcher_id)
-                    else:
-                        target_type = "person"
-                        target_id = str(ctx.event.sender_id)
+                    target_type, target_id = self._get_target(ctx)
                     
                     try:
                         if hasattr(self, "forward_message"):
-                            result = await self.forward_message.send(target_type, target_id, comic_info, images)
+                            result = await self.forward_message.send(target_type, target_id, comic_info, images, merged_images)
                             
                             if not result:
                                 self.ap.logger.warning(f"第{ep}章API合并转发发送失败，尝试使用内置合并转发")
-                                forward_chain = await build_forward_message(comic_info, images)
+                                forward_chain = await build_forward_message(comic_info, images, merged_images)
                                 await ctx.reply(forward_chain)
                         else:
-                            forward_chain = await build_forward_message(comic_info, images)
+                            forward_chain = await build_forward_message(comic_info, images, merged_images)
                             await ctx.reply(forward_chain)
                             
                     except Exception as e:
                         self.ap.logger.error(f"第{ep}章发送合并转发消息失败: {str(e)}")
-                        message_chain = await build_message_chain(comic_info, images)
+                        message_chain = await build_message_chain(comic_info, images, merged_images)
                         await ctx.reply(message_chain)
                 
                 except Exception as e:
@@ -182,9 +304,139 @@ class PicaPlugin(BasePlugin):
             self.ap.logger.error(f"获取漫画章节信息失败: {str(e)}")
             await ctx.reply(MessageChain([Plain(f"获取漫画章节信息失败: {str(e)}")]))
     
+    async def _process_export(self, ctx: EventContext, comic_id: str, export_format: str):
+        """逐章下载并写入单个打包文件，全部完成后一次上传"""
+        try:
+            episode_info = await get_comic_episodes(comic_id)
+            episodes = episode_info.get("data", {}).get("eps", {}).get("docs", [])
+            
+            if not episodes:
+                await ctx.reply(MessageChain([Plain("未找到章节信息")]))
+                return
+            
+            comic_info = await get_comic_info(comic_id)
+            title = comic_info.get("data", {}).get("comic", {}).get("title", "未知标题")
+            safe_title = re.sub(FILENAME_PATTERN, "_", title)
+            
+            total_eps = len(episodes)
+            await ctx.reply(MessageChain([Plain(f"漫画共有 {total_eps} 章，开始下载并打包为{export_format.upper()}，请耐心等待...")]))
+            
+            file_name = f"{safe_title}.{export_format}"
+            # 本地文件名带任务ID，同一漫画的多个打包任务互不覆盖，上传时仍使用漫画标题
+            export_path = os.path.join(EXPORT_DIR, f"{safe_title}-{uuid.uuid4().hex[:8]}.{export_format}")
+            writer = ComicArchiveWriter(export_path, export_format)
+            
+            try:
+                async for ep, chapter, error in self._iter_chapters(comic_id, total_eps):
+                    try:
+                        if error:
+                            raise error
+                        _, images, _, _ = chapter
+                        await asyncio.to_thread(writer.add_pages, images, f"{ep:03d}")
+                    except Exception as e:
+                        self.ap.logger.error(f"下载第{ep}章失败: {str(e)}")
+                        await ctx.reply(MessageChain([Plain(f"下载第{ep}章失败: {str(e)}")]))
+                
+                if not writer.page_count:
+                    writer.abort()
+                    await ctx.reply(MessageChain([Plain("未能下载任何图片，打包已取消")]))
+                    return
+                
+                archive_path = await asyncio.to_thread(writer.close)
+            except BaseException:
+                writer.abort()
+                raise
+            
+            await ctx.reply(MessageChain([Plain(f"打包完成，共{writer.page_count}页，正在上传文件...")]))
+            
+            target_type, target_id = self._get_target(ctx)
+            result = await self.forward_message.upload_file(target_type, target_id, archive_path, file_name)
+            if result and (result.get("status") == "ok" or result.get("retcode") == 0):
+                # 上传成功后删除本地打包文件，页面缓存仍保留
+                os.remove(archive_path)
+            else:
+                self.ap.logger.warning(f"上传打包文件失败: {result}")
+                await ctx.reply(MessageChain([Plain(f"文件上传失败，文件已保存在：{archive_path}")]))
+        
+        except Exception as e:
+            self.ap.logger.error(f"打包漫画失败: {str(e)}")
+            await ctx.reply(MessageChain([Plain(f"打包漫画失败: {str(e)}")]))
+    
+    def _get_target(self, ctx: EventContext):
+        if isinstance(ctx.event, GroupNormalMessageReceived):
+            return "group", str(ctx.event.launcher_id)
+        return "person", str(ctx.event.sender_id)
+    
+    async def _fetch_chapter(self, comic_id: str, ep: int):
+        """获取章节图片，启用独立下载进程时由下载进程完成下载与合并"""
+        if self.worker_pool:
+            try:
+                return await self.worker_pool.run(comic_id, ep)
+            except WorkerPoolClosed:
+                self.ap.logger.info(f"下载进程已关闭，第{ep}章改为在插件进程内下载")
+        
+        comic_info, images, title = await get_pica_images(comic_id, ep)
+        return comic_info, images, title, None
+    
+    async def _iter_chapters(self, comic_id: str, total_eps: int):
+        """按章节顺序产出 (章节号, 下载结果, 异常)，同时提前下载后续章节
+        
+        提前量与下载进程数一致，未启用下载进程时逐章下载。
+        """
+        window = self.worker_pool.processes if self.worker_pool else 1
+        pending = {}
+        next_ep = 1
+        try:
+            for ep in range(1, total_eps + 1):
+                while next_ep <= total_eps and next_ep < ep + window:
+                    pending[next_ep] = asyncio.create_task(self._fetch_chapter(comic_id, next_ep))
+                    next_ep += 1
+                
+                task = pending.pop(ep)
+                try:
+                    yield ep, await task, None
+                except Exception as e:
+                    yield ep, None, e
+        finally:
+            for task in pending.values():
+                task.cancel()
+    
     def _clean_finished_tasks(self):
         self.download_tasks = [task for task in self.download_tasks if not task.done()]
     
+    async def _show_status(self, ctx: EventContext):
+        """显示当前自适应并发限制和各接口延迟情况"""
+        status_text = ["漫画插件运行状态"]
+        for name, elapsed in self.startup_timings.items():
+            status_text.append(f"启动耗时（{name}）：{elapsed:.0f}ms")
+        
+        # 启用下载进程时章节下载在各下载进程中进行，各自有独立的并发限制
+        sources = [("插件进程", get_client().limits())]
+        if self.worker_pool:
+            sources.extend((f"下载进程{pid}", limits) for pid, limits in await self.worker_pool.limits())
+        
+        for source, limits in sources:
+            for limiter in limits.values():
+                status_text.append("")
+                status_text.append(f"【{source} {limiter['name']}】并发上限：{limiter['limit']}，进行中：{limiter['in_flight']}")
+                for endpoint, stats in limiter["endpoints"].items():
+                    status_text.append(
+                        f"{endpoint}: p50={stats['p50']}s p90={stats['p90']}s p99={stats['p99']}s "
+                        f"失败率={stats['error_rate']:.0%} 超时率={stats['timeout_rate']:.0%} "
+                        f"超时={stats['timeout']}s 请求数={stats['samples']}"
+                    )
+        
+        await ctx.reply(MessageChain([Plain("\n".join(status_text))]))
+    
+    async def _reload_config(self, ctx: EventContext):
+        """重新加载配置文件，校验失败时保留原配置"""
+        try:
+            config_service.load()
+            await ctx.reply(MessageChain([Plain("漫画插件配置已重新加载")]))
+        except Exception as e:
+            self.ap.logger.error(f"重新加载漫画插件配置失败: {str(e)}")
+            await ctx.reply(MessageChain([Plain(f"重新加载配置失败，继续使用原配置: {str(e)}")]))
+    
     async def _show_help(self, ctx: EventContext):
         """显示帮助信息"""
         help_text = [
@@ -192,12 +444,24 @@ class PicaPlugin(BasePlugin):
             "",
             "【搜索漫画】",
             "命令：搜漫画 关键词 [页码]",
-            "说明：搜索漫画，返回搜索结果，可指定页码",
+            "说明：搜索漫画，返回搜索结果（开启后附带封面拼图），可指定页码",
             "",
             "【下载漫画】",
             "命令：看漫画 漫画ID",
             "说明：下载指定ID的漫画全部章节",
             "",
+            "【打包下载】",
+            "命令：看漫画 漫画ID 打包 [cbz/zip/pdf]",
+            "说明：将全部章节打包为单个文件后上传",
+            "",
+            "【运行状态】",
+            "命令：漫画状态",
+            "说明：显示当前并发上限和接口延迟",
+            "",
+            "【重载配置】",
+            "命令：漫画重载配置",
+            "说明：修改配置文件后立即生效，无需重启",
+            "",
             "【帮助信息】",
             "命令：漫画帮助",
             "说明：显示插件帮助信息"
@@ -205,8 +469,21 @@ class PicaPlugin(BasePlugin):
         
         await ctx.reply(MessageChain([Plain("\n".join(help_text))]))
     
-    def __del__(self):
-        for task in self.download_tasks:
-            if not task.done():
+    async def destroy(self):
+        """插件卸载时取消配置监听和后台任务，关闭下载进程并等待其退出"""
+        config_service.unsubscribe(self._on_config_changed)
+        config_service.stop_watching()
+        
+        tasks = [self.warm_up_task, *self.config_tasks, *self.download_tasks]
+        for task in tasks:
+            if task and not task.done():
                 task.cancel()
-        self.download_tasks.clear() 
+        self.download_tasks.clear()
+        
+        if self.cache_warmer:
+            self.cache_warmer.stop()
+            self.cache_warmer = None
+        
+        if self.worker_pool:
+            worker_pool, self.worker_pool = self.worker_pool, None
+            await worker_pool.stop()
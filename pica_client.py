@@ -1,10 +1,12 @@
 from time import time
-import aiohttp
 import hmac
 import hashlib
 from typing import Optional, Dict, List, Any
 import os
+import uuid
+from urllib.parse import quote
 from asyncio.exceptions import TimeoutError
+from .limiter import AdaptiveLimiter, RequestRejected
 
 try:
     import ujson as json
@@ -16,6 +18,25 @@ api_key = "C69BAF41DA5ABD1FFEDC6D2FEA56B"
 secret_key = r"~d}$Q7$eIni=V)9\RK/P.RM4;9[7|@/CA}b~OW!3?EV`:<>M7pddUBL5n|0/*Cn"
 base = "https://picaapi.picacomic.com"
 
+async def _raise_for_status(response) -> None:
+    """429和5xx视为拥塞，其余非2xx响应为请求本身的错误，不影响并发上限"""
+    if 200 <= response.status < 300:
+        return
+
+    # 哔咔的错误响应为JSON，保留其中的错误信息
+    message = f"HTTP {response.status}"
+    try:
+        body = await response.json(content_type=None)
+        detail = body.get("message") or body.get("error")
+        if detail:
+            message = f"{message}: {detail}"
+    except Exception:
+        pass
+
+    if response.status == 429 or response.status >= 500:
+        raise Exception(message)
+    raise RequestRejected(message)
+
 class PicaClient:
     Order_Default = "ua"
     Order_Latest = "dd"
@@ -23,8 +44,10 @@ class PicaClient:
     Order_Loved = "ld"
     Order_Point = "vd"
 
-    def __init__(self, proxy: Optional[str] = None) -> None:
+    def __init__(self, proxy: Optional[str] = None, api_limits: Optional[Dict[str, Any]] = None, image_limits: Optional[Dict[str, Any]] = None) -> None:
         self.proxy = proxy
+        self.api_limiter = AdaptiveLimiter("api", **{"initial_limit": 4, "max_limit": 16, "timeout": 30, **(api_limits or {})})
+        self.image_limiter = AdaptiveLimiter("image", **{"initial_limit": 4, "max_limit": 32, "timeout": 60, **(image_limits or {})})
         self.headers = {
             "api-key":           api_key,
             "accept":            "application/vnd.picacomic.com.v1+json",
@@ -41,7 +64,18 @@ class PicaClient:
         }
         self.is_login = False
 
-    async def http_request(self, method: str, url: str, json_data: str = "") -> Dict[str, Any]:
+    def configure_limits(self, api_limits: Optional[Dict[str, Any]] = None, image_limits: Optional[Dict[str, Any]] = None) -> None:
+        self.api_limiter.configure(**(api_limits or {}))
+        self.image_limiter.configure(**(image_limits or {}))
+
+    def limits(self) -> Dict[str, Any]:
+        """导出当前并发限制、各接口延迟分位数和超时时间，便于调参"""
+        return {
+            "api": self.api_limiter.snapshot(),
+            "image": self.image_limiter.snapshot(),
+        }
+
+    async def http_request(self, method: str, url: str, json_data: str = "", endpoint: str = "api") -> Dict[str, Any]:
         header = self.headers.copy()
         ts = str(int(time()))
         raw = url.replace("https://picaapi.picacomic.com/", "") + str(ts) + nonce + method + api_key
@@ -53,25 +87,30 @@ class PicaClient:
         header["time"] = ts
         
         try:
-            async with aiohttp.ClientSession() as session:
-                kwargs = {
-                    "headers": header,
-                    "ssl": False,
-                    "timeout": 30
-                }
-                
-                # 只有当代理配置存在时才添加代理
-                if self.proxy:
-                    kwargs["proxy"] = self.proxy
-                
-                if method == "GET":
-                    rs = await session.get(url=url, **kwargs)
-                elif method == "POST":
-                    kwargs["data"] = json_data
-                    rs = await session.post(url=url, **kwargs)
-                
-                response = await rs.json()
-                return response
+            import aiohttp
+            async with self.api_limiter.acquire(endpoint) as timeout:
+                async with aiohttp.ClientSession() as session:
+                    kwargs = {
+                        "headers": header,
+                        "ssl": False,
+                        "timeout": timeout
+                    }
+                    
+                    # 只有当代理配置存在时才添加代理
+                    if self.proxy:
+                        kwargs["proxy"] = self.proxy
+                    
+                    if method == "GET":
+                        rs = await session.get(url=url, **kwargs)
+                    elif method == "POST":
+                        kwargs["data"] = json_data
+                        rs = await session.post(url=url, **kwargs)
+                    
+                    # 在并发限制内检查状态码，只有429/5xx会触发并发收缩
+                    await _raise_for_status(rs)
+                    
+                    response = await rs.json()
+                    return response
         except TimeoutError:
             raise Exception("请求超时，请检查网络和代理设置")
         except Exception as e:
@@ -86,7 +125,7 @@ class PicaClient:
         send = {"email": str(email), "password": str(password)}
         
         try:
-            response = await self.http_request(method="POST", url=url, json_data=json.dumps(send))
+            response = await self.http_request(method="POST", url=url, json_data=json.dumps(send), endpoint="auth/sign-in")
             token = response["data"]["token"]
             self.headers["authorization"] = token
             self.is_login = True
@@ -102,22 +141,29 @@ class PicaClient:
             "sort": sort
         }
         url = f"{base}/comics/advanced-search?page={page}"
-        response = await self.http_request(method="POST", url=url, json_data=json.dumps(jso))
+        response = await self.http_request(method="POST", url=url, json_data=json.dumps(jso), endpoint="comics/advanced-search")
+        return response
+
+    async def comics(self, category: Optional[str] = None, sort: str = Order_Default, page: int = 1) -> Dict[str, Any]:
+        url = f"{base}/comics?page={page}&s={sort}"
+        if category:
+            url += f"&c={quote(category)}"
+        response = await self.http_request(method="GET", url=url, endpoint="comics/list")
         return response
 
     async def comic_info(self, book_id: str) -> Dict[str, Any]:
         url = f"{base}/comics/{book_id}"
-        response = await self.http_request(method="GET", url=url)
+        response = await self.http_request(method="GET", url=url, endpoint="comics/info")
         return response
 
     async def episodes(self, book_id: str, page: int = 1) -> Dict[str, Any]:
         url = f"{base}/comics/{book_id}/eps?page={page}"
-        response = await self.http_request(method="GET", url=url)
+        response = await self.http_request(method="GET", url=url, endpoint="comics/eps")
         return response
 
     async def picture(self, book_id: str, ep_id: int = 1, page: int = 1) -> Dict[str, Any]:
         url = f"{base}/comics/{book_id}/order/{ep_id}/pages?page={page}"
-        response = await self.http_request(method="GET", url=url)
+        response = await self.http_request(method="GET", url=url, endpoint="comics/pages")
         return response
 
     async def download_image(self, url: str, save_path: str) -> bool:
@@ -126,25 +172,33 @@ class PicaClient:
         #     return False
             
         try:
+            import aiohttp
             os.makedirs(os.path.dirname(save_path), exist_ok=True)
             
-            async with aiohttp.ClientSession() as session:
-                kwargs = {
-                    "ssl": False,
-                    "timeout": 60
-                }
-                
-                # 只有当代理配置存在时才添加代理
-                if self.proxy:
-                    kwargs["proxy"] = self.proxy
+            async with self.image_limiter.acquire("image") as timeout:
+                async with aiohttp.ClientSession() as session:
+                    kwargs = {
+                        "ssl": False,
+                        "timeout": timeout
+                    }
                     
-                async with session.get(url, **kwargs) as response:
-                    if response.status == 200:
+                    # 只有当代理配置存在时才添加代理
+                    if self.proxy:
+                        kwargs["proxy"] = self.proxy
+                        
+                    async with session.get(url, **kwargs) as response:
+                        await _raise_for_status(response)
                         data = await response.read()
-                        with open(save_path, "wb") as f:
-                            f.write(data)
-                        return True
-                    else:
-                        return False
+            
+            # 先写入临时文件再替换，下载进程在写入途中被终止时不会留下被当作缓存的残缺图片
+            temp_path = f"{save_path}.{os.getpid()}.{uuid.uuid4().hex}.part"
+            try:
+                with open(temp_path, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, save_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            return True
         except Exception as e:
             return False
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+import yaml
+
+from pica_plugin.config import CONFIG_PATH, ConfigError, ConfigService, PluginConfig, parse_config
+
+
+def test_shipped_config_is_valid():
+    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+        config = parse_config(yaml.safe_load(f))
+    assert isinstance(config, PluginConfig)
+    assert config.contact_sheet.enabled is False
+
+
+@pytest.mark.parametrize("data, message", [
+    ({"forwrd": {"sender_name": "漫画"}}, "forwrd"),
+    ({"warmup": {"bandwith_kbps": 1024}}, "warmup.bandwith_kbps"),
+    ({"concurrency": {"image": {"max": 8}}}, "concurrency.image.max"),
+])
+def test_unknown_keys_are_reported_with_path(data, message):
+    with pytest.raises(ConfigError, match=f"未知的配置项: {message}"):
+        parse_config(data)
+
+
+@pytest.mark.parametrize("data, message", [
+    ({"warmup": {"top_n": -1}}, "warmup.top_n"),
+    ({"warmup": {"chapters": -1}}, "warmup.chapters"),
+    ({"warmup": {"bandwidth_kbps": -1}}, "warmup.bandwidth_kbps"),
+    ({"meta_cache_ttl": -1}, "meta_cache_ttl"),
+    ({"episodes_cache_ttl": -1}, "episodes_cache_ttl"),
+    ({"concurrency": {"api": {"initial_limit": 20, "max_limit": 16}}}, "concurrency.api.initial_limit"),
+    ({"concurrency": {"image": {"initial_limit": 8, "max_limit": 4}}}, "concurrency.image.initial_limit"),
+])
+def test_invalid_values_are_rejected(data, message):
+    with pytest.raises(ConfigError, match=message):
+        parse_config(data)
+
+
+def test_zero_disables_cache_and_bandwidth_limit():
+    config = parse_config({"meta_cache_ttl": 0, "episodes_cache_ttl": 0, "warmup": {"bandwidth_kbps": 0}})
+    assert config.meta_cache_ttl == 0
+    assert config.warmup.bandwidth_kbps == 0
+
+
+def test_unsubscribed_listener_is_not_called(tmp_path):
+    path = os.path.join(tmp_path, "config.yaml")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("max_search_results: 5\n")
+
+    service = ConfigService(path)
+    calls = []
+    listener = lambda old, new: calls.append(new.max_search_results)
+
+    service.subscribe(listener)
+    service.load()
+    service.unsubscribe(listener)
+    service.load()
+
+    assert calls == [5]
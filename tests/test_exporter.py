@@ -0,0 +1,122 @@
+import io
+import os
+import re
+import zipfile
+
+import pytest
+from PIL import Image
+
+from pica_plugin.exporter import ComicArchiveWriter
+
+
+def _page(tmp_path, name: str, mode: str = "RGB", fmt: str = "JPEG", size=(60, 90)) -> str:
+    path = os.path.join(tmp_path, name)
+    color = {"RGB": (200, 30, 30), "L": 128, "CMYK": (0, 255, 255, 0), "RGBA": (30, 200, 30, 128)}[mode]
+    Image.new(mode, size, color).save(path, fmt)
+    return path
+
+
+def _pdf_objects(data: bytes):
+    """按交叉引用表解析对象偏移，返回 {对象号: 偏移}"""
+    startxref = int(re.search(rb"startxref\n(\d+)\n%%EOF", data).group(1))
+    header = re.match(rb"xref\n0 (\d+)\n", data[startxref:])
+    assert header, "startxref 未指向交叉引用表"
+
+    count = int(header.group(1))
+    entries = data[startxref + header.end():].split(b"\n")[:count]
+    assert entries[0] == b"0000000000 65535 f "
+    return {obj_id: int(entry[:10]) for obj_id, entry in enumerate(entries) if obj_id}
+
+
+def _pdf_images(data: bytes):
+    for match in re.finditer(rb"/ColorSpace /(\w+) .*?/Length (\d+) >>\nstream\n", data):
+        start = match.end()
+        yield match.group(1).decode(), data[start:start + int(match.group(2))]
+
+
+@pytest.mark.parametrize("fmt", ["cbz", "zip"])
+def test_zip_entries_are_stored_and_numbered(tmp_path, fmt):
+    first = [_page(tmp_path, f"a{i}.jpg") for i in range(3)]
+    second = [_page(tmp_path, "b0.png", fmt="PNG")]
+
+    writer = ComicArchiveWriter(os.path.join(tmp_path, "export", f"comic.{fmt}"), fmt)
+    writer.add_pages(first, "001")
+    writer.add_pages(second, "002")
+    path = writer.close()
+
+    assert writer.page_count == 4
+    assert not os.path.exists(writer.temp_path)
+    with zipfile.ZipFile(path) as archive:
+        infos = archive.infolist()
+        assert [info.filename for info in infos] == ["001/0001.jpg", "001/0002.jpg", "001/0003.jpg", "002/0001.png"]
+        assert all(re.fullmatch(r"\d{3}/\d{4}\.\w+", info.filename) for info in infos)
+        assert all(info.compress_type == zipfile.ZIP_STORED for info in infos)
+        with open(first[0], "rb") as f:
+            assert archive.read("001/0001.jpg") == f.read()
+
+
+def test_pdf_xref_offsets_and_page_count(tmp_path):
+    pages = [_page(tmp_path, f"p{i}.jpg", size=(60 + i, 90)) for i in range(3)]
+
+    writer = ComicArchiveWriter(os.path.join(tmp_path, "comic.pdf"), "pdf")
+    writer.add_pages(pages[:2], "001")
+    writer.add_pages(pages[2:], "002")
+    path = writer.close()
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    assert data.startswith(b"%PDF-1.4\n")
+    offsets = _pdf_objects(data)
+    for obj_id, offset in offsets.items():
+        assert data[offset:].startswith(f"{obj_id} 0 obj\n".encode())
+
+    count = int(re.search(rb"/Type /Pages /Kids \[[^\]]*\] /Count (\d+)", data).group(1))
+    assert count == writer.page_count == 3
+    assert len(re.findall(rb"/Type /Page ", data)) == 3
+
+    # JPEG页面原样嵌入，不重新编码
+    with open(pages[0], "rb") as f:
+        assert next(_pdf_images(data)) == ("DeviceRGB", f.read())
+
+
+def test_pdf_converts_other_modes(tmp_path):
+    gray = _page(tmp_path, "gray.jpg", mode="L")
+    cmyk = _page(tmp_path, "cmyk.jpg", mode="CMYK")
+    rgba = _page(tmp_path, "rgba.png", mode="RGBA", fmt="PNG")
+
+    writer = ComicArchiveWriter(os.path.join(tmp_path, "comic.pdf"), "pdf")
+    writer.add_pages([gray, cmyk, rgba], "001")
+    with open(writer.close(), "rb") as f:
+        images = list(_pdf_images(f.read()))
+
+    assert [color_space for color_space, _ in images] == ["DeviceGray", "DeviceRGB", "DeviceRGB"]
+    with open(gray, "rb") as f:
+        assert images[0][1] == f.read()
+    for _, stream in images[1:]:
+        with Image.open(io.BytesIO(stream)) as img:
+            assert (img.format, img.mode, img.size) == ("JPEG", "RGB", (60, 90))
+
+
+@pytest.mark.parametrize("fmt", ["cbz", "pdf"])
+def test_abort_removes_part_file(tmp_path, fmt):
+    output_path = os.path.join(tmp_path, f"comic.{fmt}")
+    writer = ComicArchiveWriter(output_path, fmt)
+    writer.add_pages([_page(tmp_path, "p.jpg")], "001")
+    assert os.path.exists(writer.temp_path)
+
+    writer.abort()
+
+    assert not os.path.exists(writer.temp_path)
+    assert not os.path.exists(output_path)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".part")]
+
+
+def test_concurrent_writers_use_separate_part_files(tmp_path):
+    output_path = os.path.join(tmp_path, "comic.cbz")
+    first = ComicArchiveWriter(output_path, "cbz")
+    second = ComicArchiveWriter(output_path, "cbz")
+
+    assert first.temp_path != second.temp_path
+    first.abort()
+    second.abort()
@@ -0,0 +1,40 @@
+import os
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from pica_plugin import get_image
+
+
+class SlowJson:
+    """分两次写入并在中间停顿，使并发写入必然交错"""
+    load = staticmethod(json.load)
+
+    @staticmethod
+    def dump(obj, f, **kwargs):
+        text = json.dumps(obj, **kwargs)
+        f.write(text[:len(text) // 2])
+        f.flush()
+        time.sleep(0.02)
+        f.write(text[len(text) // 2:])
+
+
+def test_concurrent_meta_writers_do_not_collide(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_image, "META_DIR", str(tmp_path))
+    monkeypatch.setattr(get_image, "json", SlowJson)
+
+    def write(i: int):
+        async def fetch():
+            return {"data": {"writer": i}}
+
+        # 缓存不存在时请求接口并写入，模拟多个下载进程同时写入同一条元数据
+        return asyncio.run(get_image._cached_meta("comic-info", fetch, ttl=3600))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(write, range(8)))
+
+    assert all(result["data"]["writer"] in range(8) for result in results)
+    assert os.listdir(tmp_path) == ["comic-info.json"]
+    with open(os.path.join(tmp_path, "comic-info.json"), encoding="utf-8") as f:
+        assert json.load(f)["data"]["writer"] in range(8)
@@ -0,0 +1,156 @@
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from aiohttp import web
+
+from pica_plugin.pica_client import PicaClient
+
+
+@asynccontextmanager
+async def stub_server():
+    """本地桩服务器，通过查询参数注入延迟和错误状态码"""
+    async def handle(request: web.Request) -> web.Response:
+        await asyncio.sleep(float(request.query.get("delay", 0)))
+        status = int(request.query.get("status", 200))
+        body = {"code": status}
+        if "message" in request.query:
+            # 与哔咔的错误响应格式一致
+            body.update(error="1005", message=request.query["message"])
+        return web.json_response(body, status=status)
+
+    app = web.Application()
+    app.router.add_get("/api", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}/api"
+    finally:
+        await runner.cleanup()
+
+
+async def _requests(client: PicaClient, url: str, count: int, concurrency: int = 4):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            return await client.http_request("GET", url, endpoint="stub")
+
+    return await asyncio.gather(*(one() for _ in range(count)), return_exceptions=True)
+
+
+def test_limit_rises_on_success_and_falls_on_errors():
+    async def scenario():
+        client = PicaClient(api_limits={"initial_limit": 2, "max_limit": 16})
+        limiter = client.api_limiter
+
+        async with stub_server() as url:
+            results = await _requests(client, f"{url}?delay=0.02", 40)
+            assert not any(isinstance(result, Exception) for result in results)
+            raised = limiter.limit
+            assert raised > 2
+
+            with pytest.raises(Exception, match="HTTP 500"):
+                await client.http_request("GET", f"{url}?status=500", endpoint="stub")
+            assert limiter.limit == pytest.approx(raised * 0.5)
+
+            # 同一轮内的连续失败只收缩一次
+            with pytest.raises(Exception, match="HTTP 429"):
+                await client.http_request("GET", f"{url}?status=429", endpoint="stub")
+            assert limiter.limit == pytest.approx(raised * 0.5)
+
+            await asyncio.sleep(1.1)
+            with pytest.raises(Exception, match="HTTP 429"):
+                await client.http_request("GET", f"{url}?status=429", endpoint="stub")
+            assert limiter.limit == pytest.approx(max(raised * 0.25, 1))
+
+        stats = client.limits()["api"]["endpoints"]["stub"]
+        assert stats["error_rate"] > 0
+
+    asyncio.run(scenario())
+
+
+def test_client_errors_keep_limit_and_message(tmp_path):
+    async def scenario():
+        client = PicaClient(api_limits={"initial_limit": 8}, image_limits={"initial_limit": 8})
+
+        async with stub_server() as url:
+            for status, message in ((400, "invalid comic id"), (401, "unauthorized"), (404, "not found")):
+                with pytest.raises(Exception, match=f"HTTP {status}: {message}"):
+                    await client.http_request("GET", f"{url}?status={status}&message={message}", endpoint="stub")
+            assert client.api_limiter.limit == 8
+            assert client.limits()["api"]["endpoints"]["stub"]["error_rate"] == 1
+
+            # 缺失的图片页同样不影响图片并发，服务端过载时才收缩
+            assert not await client.download_image(f"{url}?status=404", os.path.join(tmp_path, "missing.jpg"))
+            assert client.image_limiter.limit == 8
+            assert not await client.download_image(f"{url}?status=503", os.path.join(tmp_path, "busy.jpg"))
+            assert client.image_limiter.limit == 4
+
+            with pytest.raises(Exception, match="HTTP 429: slow down"):
+                await client.http_request("GET", f"{url}?status=429&message=slow down", endpoint="stub")
+            assert client.api_limiter.limit == 4
+
+    asyncio.run(scenario())
+
+
+def test_download_leaves_no_partial_file(tmp_path):
+    async def scenario():
+        client = PicaClient()
+        save_path = os.path.join(tmp_path, "page.jpg")
+        async with stub_server() as url:
+            assert await client.download_image(url, save_path)
+        assert os.listdir(tmp_path) == ["page.jpg"]
+        with open(save_path, "rb") as f:
+            assert f.read() == b'{"code": 200}'
+
+    asyncio.run(scenario())
+
+
+def test_limit_stays_within_configured_bounds():
+    async def scenario():
+        client = PicaClient(api_limits={"initial_limit": 2, "max_limit": 3})
+        async with stub_server() as url:
+            await _requests(client, f"{url}?delay=0.01", 30)
+            assert client.api_limiter.limit == 3
+
+            for _ in range(3):
+                with pytest.raises(Exception):
+                    await client.http_request("GET", f"{url}?status=503", endpoint="stub")
+                client.api_limiter._last_decrease = 0
+            assert client.api_limiter.limit == 1
+
+    asyncio.run(scenario())
+
+
+def test_timeout_follows_endpoint_latency():
+    async def scenario():
+        client = PicaClient(api_limits={"timeout": 30, "min_timeout": 0.1})
+        limiter = client.api_limiter
+
+        async with stub_server() as url:
+            await _requests(client, f"{url}?delay=0.02", 10)
+            # 样本不足时使用配置的默认超时
+            assert limiter.timeout_for("stub") == 30
+
+            await _requests(client, f"{url}?delay=0.02", 20)
+            fast_timeout = limiter.timeout_for("stub")
+            assert 0.1 <= fast_timeout < 1
+
+            # 超时时间收紧后，明显变慢的请求会被及时中断
+            started = time.monotonic()
+            with pytest.raises(Exception, match="请求超时"):
+                await client.http_request("GET", f"{url}?delay=3", endpoint="stub")
+            assert time.monotonic() - started < 2
+            assert limiter.endpoints["stub"].timeout_rate > 0
+
+            # 延迟整体升高后，p99随之升高，超时时间放宽
+            await _requests(client, f"{url}?delay=0.3", 30, concurrency=8)
+            assert limiter.timeout_for("stub") > fast_timeout
+
+    asyncio.run(scenario())
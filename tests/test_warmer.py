@@ -0,0 +1,99 @@
+import time
+import asyncio
+from datetime import datetime, date
+
+import pytest
+
+from pica_plugin import warmer as warmer_module
+from pica_plugin.config import WarmupConfig
+from pica_plugin.warmer import BandwidthThrottle, CacheWarmer
+
+
+def test_throttle_limits_rate_and_concurrency():
+    async def scenario():
+        throttle = BandwidthThrottle(bandwidth_kbps=1, concurrency=2)
+        active = 0
+        peak = 0
+
+        async def download():
+            nonlocal active, peak
+            async with throttle.slot():
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.01)
+                active -= 1
+            throttle.consume(256)
+
+        started = time.monotonic()
+        await asyncio.gather(*(download() for _ in range(6)))
+        elapsed = time.monotonic() - started
+
+        assert peak <= 2
+        assert throttle.consumed == 6 * 256
+        # 1KB/s下前两张可立即开始，其余须等待已下载字节的额度恢复
+        assert elapsed >= (6 - 2) * 256 / 1024 - 0.05
+
+    asyncio.run(scenario())
+
+
+def test_throttle_without_limit_does_not_wait():
+    async def scenario():
+        throttle = BandwidthThrottle(bandwidth_kbps=0, concurrency=4)
+        started = time.monotonic()
+        for _ in range(10):
+            async with throttle.slot():
+                pass
+            throttle.consume(10 * 1024 * 1024)
+        assert time.monotonic() - started < 0.5
+
+    asyncio.run(scenario())
+
+
+class _Logger:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+@pytest.mark.parametrize("quiet_hours, now, expected", [
+    ([2, 7], datetime(2026, 1, 1, 3), date(2026, 1, 1)),
+    ([2, 7], datetime(2026, 1, 1, 7), None),
+    ([22, 6], datetime(2026, 1, 1, 23), date(2026, 1, 1)),
+    ([22, 6], datetime(2026, 1, 2, 1), date(2026, 1, 1)),
+    ([22, 6], datetime(2026, 1, 2, 12), None),
+])
+def test_quiet_window_start(quiet_hours, now, expected):
+    warmer = CacheWarmer(WarmupConfig(quiet_hours=quiet_hours), _Logger())
+    assert warmer.quiet_window_start(now) == expected
+
+
+def test_window_across_midnight_warms_once(monkeypatch):
+    times = iter([
+        datetime(2026, 1, 1, 22, 30),
+        datetime(2026, 1, 1, 23, 30),
+        datetime(2026, 1, 2, 0, 30),
+        datetime(2026, 1, 2, 5, 30),
+        datetime(2026, 1, 2, 12, 0),
+        datetime(2026, 1, 2, 22, 30),
+    ])
+
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            try:
+                return next(times)
+            except StopIteration:
+                raise asyncio.CancelledError()
+
+    monkeypatch.setattr(warmer_module, "datetime", FakeDatetime)
+
+    warmer = CacheWarmer(WarmupConfig(quiet_hours=[22, 6], check_interval=0), _Logger())
+    runs = []
+
+    async def warm_once():
+        runs.append(warmer._last_window)
+
+    warmer.warm_once = warm_once
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(warmer._run())
+    assert runs == [date(2026, 1, 1), date(2026, 1, 2)]
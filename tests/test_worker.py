@@ -0,0 +1,201 @@
+import os
+import asyncio
+from contextlib import closing
+
+import pytest
+
+from pica_plugin.worker import JobQueue, WorkerPool, WorkerPoolClosed
+
+
+class FakeProcess:
+    """代替下载进程，只记录是否被终止"""
+    next_pid = 100000
+
+    def __init__(self):
+        FakeProcess.next_pid += 1
+        self.pid = FakeProcess.next_pid
+        self.returncode = None
+
+    def terminate(self):
+        if self.returncode is None:
+            self.returncode = -15
+
+    async def wait(self):
+        return self.returncode
+
+
+def _pool(tmp_path, processes: int = 1) -> WorkerPool:
+    pool = WorkerPool(processes, 0.01, os.path.join(tmp_path, "jobs.sqlite3"))
+
+    async def spawn():
+        return FakeProcess()
+
+    pool._spawn = spawn
+    return pool
+
+
+def test_claim_requeue_and_delete(tmp_path):
+    queue = JobQueue(os.path.join(tmp_path, "jobs.sqlite3"))
+    first = queue.submit("comic", 1)
+    second = queue.submit("comic", 2)
+
+    assert queue.claim() == (first, "comic", 1)
+    assert queue.claim() == (second, "comic", 2)
+    assert queue.claim() is None
+    assert queue.poll(first)[0] == "running"
+
+    # 只重新入队指定进程领取的任务
+    queue.requeue_running(worker=os.getpid() + 1)
+    assert queue.poll(first)[0] == "running"
+    queue.requeue_running(worker=os.getpid())
+    assert queue.poll(first)[0] == "pending"
+    assert queue.poll(second)[0] == "pending"
+
+    assert queue.claim() == (first, "comic", 1)
+    queue.finish(first, {"images": []})
+    assert queue.poll(first) == ("done", '{"images": []}', None)
+
+    queue.delete(first)
+    assert queue.poll(first) is None
+
+
+def test_worker_limits_are_reported_per_process(tmp_path):
+    queue = JobQueue(os.path.join(tmp_path, "jobs.sqlite3"))
+    queue.report_limits({"api": {"name": "api", "limit": 6}})
+
+    assert queue.worker_limits([os.getpid()]) == [(os.getpid(), {"api": {"name": "api", "limit": 6}})]
+    # 已退出的下载进程的快照会被清理
+    assert queue.worker_limits([]) == []
+    assert queue.worker_limits([os.getpid()]) == []
+
+
+def _mark_busy(pool: WorkerPool, proc: FakeProcess):
+    job_id = pool.queue.submit("comic", 1)
+    pool.queue.claim()
+    with closing(pool.queue._connect()) as conn:
+        conn.execute("UPDATE jobs SET worker = ? WHERE id = ?", (proc.pid, job_id))
+
+
+def test_shrink_retires_idle_workers_without_terminating(tmp_path):
+    async def scenario():
+        pool = _pool(tmp_path, processes=3)
+        await pool.start()
+        first, second, third = pool.workers
+        _mark_busy(pool, first)
+
+        await pool.resize(1, pool.poll_interval)
+
+        assert all(proc.returncode is None for proc in (first, second, third))
+        assert pool.retiring == {second.pid, third.pid}
+        assert pool.queue.control(second.pid)[0]
+        assert not pool.queue.control(first.pid)[0]
+
+        # 退出的进程被移除，不会补充新进程
+        second.returncode = third.returncode = 0
+        await pool.resize(1, pool.poll_interval)
+        assert pool.workers == [first]
+        assert pool.retiring == set()
+        assert not pool.queue.control(second.pid)[0]
+
+    asyncio.run(scenario())
+
+
+def test_busy_worker_is_retired_last(tmp_path):
+    async def scenario():
+        pool = _pool(tmp_path, processes=2)
+        await pool.start()
+        busy, idle = pool.workers
+        _mark_busy(pool, busy)
+
+        await pool.resize(1, pool.poll_interval)
+        assert pool.retiring == {idle.pid}
+
+        await pool.resize(0, pool.poll_interval)
+        # 进程数最少为1，忙碌进程继续完成当前任务
+        assert pool.retiring == {idle.pid}
+        assert busy.returncode is None
+
+    asyncio.run(scenario())
+
+
+def test_grow_reuses_retiring_workers(tmp_path):
+    async def scenario():
+        pool = _pool(tmp_path, processes=2)
+        await pool.start()
+        workers = list(pool.workers)
+
+        await pool.resize(1, pool.poll_interval)
+        await pool.resize(2, pool.poll_interval)
+
+        assert pool.workers == workers
+        assert pool.retiring == set()
+        assert not any(pool.queue.control(proc.pid)[0] for proc in workers)
+
+    asyncio.run(scenario())
+
+
+def test_poll_interval_change_keeps_workers(tmp_path):
+    async def scenario():
+        pool = _pool(tmp_path, processes=2)
+        await pool.start()
+        workers = list(pool.workers)
+        assert pool.queue.control(workers[0].pid) == (False, 0.01)
+
+        await pool.resize(2, 0.2)
+
+        assert pool.workers == workers
+        assert all(proc.returncode is None for proc in workers)
+        assert pool.queue.control(workers[0].pid) == (False, 0.2)
+
+    asyncio.run(scenario())
+
+
+def test_run_returns_worker_result(tmp_path):
+    async def scenario():
+        pool = _pool(tmp_path)
+        await pool.start()
+        task = asyncio.create_task(pool.run("comic", 3))
+
+        # 模拟下载进程领取并完成任务
+        job = None
+        while job is None:
+            await asyncio.sleep(0.01)
+            job = pool.queue.claim()
+        pool.queue.finish(job[0], {"comic_info": {}, "images": ["a.jpg"], "title": "t", "merged_images": []})
+
+        assert await task == ({}, ["a.jpg"], "t", [])
+        assert pool.queue.poll(job[0]) is None
+
+    asyncio.run(scenario())
+
+
+def test_run_on_closed_pool_raises(tmp_path):
+    async def scenario():
+        pool = _pool(tmp_path)
+        await pool.start()
+        await pool.stop()
+
+        assert pool.workers == []
+        with pytest.raises(WorkerPoolClosed):
+            await pool.run("comic", 1)
+
+    asyncio.run(scenario())
+
+
+def test_stop_during_run_raises_and_cleans_up(tmp_path):
+    async def scenario():
+        pool = _pool(tmp_path, processes=2)
+        await pool.start()
+        workers = list(pool.workers)
+        task = asyncio.create_task(pool.run("comic", 1))
+        await asyncio.sleep(0.05)
+
+        await pool.stop()
+
+        # 调用方收到WorkerPoolClosed后改为在插件进程内下载，队列中不残留该任务
+        with pytest.raises(WorkerPoolClosed):
+            await task
+        assert all(proc.returncode is not None for proc in workers)
+        assert pool.queue.claim() is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,172 @@
+import os
+import re
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, date, timedelta
+from typing import List, Optional
+from .config import WarmupConfig
+from .get_image import (
+    list_comics, search_comics, get_comic_info, get_comic_episodes, download_comic_images,
+    CACHE_DIR, FILENAME_PATTERN
+)
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+
+class BandwidthThrottle:
+    """令牌桶方式限制下载速度：每次下载前等待额度恢复，下载完成后按实际字节数扣除"""
+
+    def __init__(self, bandwidth_kbps: int, concurrency: int = 2):
+        self.rate = bandwidth_kbps * 1024
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.next_free = time.monotonic()
+        self.consumed = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self.semaphore:
+            delay = self.next_free - time.monotonic()
+            if self.rate > 0 and delay > 0:
+                await asyncio.sleep(delay)
+            yield
+
+    def consume(self, size: int):
+        self.consumed += size
+        if self.rate > 0:
+            self.next_free = max(self.next_free, time.monotonic()) + size / self.rate
+
+
+class CacheWarmer:
+    """在闲时按排行榜、关键词和分类预先缓存热门漫画的元数据和开头章节"""
+
+    def __init__(self, settings: WarmupConfig, logger):
+        self.logger = logger
+        self.settings = settings
+        self.task: asyncio.Task = None
+        self._last_window = None
+
+    def configure(self, settings: WarmupConfig):
+        """热重载时替换预热配置，下一次检查或下一章预热时生效"""
+        self.settings = settings
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+
+    def quiet_window_start(self, now: datetime = None) -> Optional[date]:
+        """当前所处预热时段的开始日期，不在预热时段内时返回None
+
+        跨越午夜的时段（如[22, 6]）在午夜后仍属于前一天开始的时段。
+        """
+        now = now or datetime.now()
+        start, end = self.settings.quiet_hours
+        hour = now.hour
+        if start <= end:
+            return now.date() if start <= hour < end else None
+        if hour >= start:
+            return now.date()
+        if hour < end:
+            return now.date() - timedelta(days=1)
+        return None
+
+    def in_quiet_hours(self) -> bool:
+        return self.quiet_window_start() is not None
+
+    async def _run(self):
+        while True:
+            # 每个预热时段只执行一次，跨越午夜的时段不会在午夜后再次执行
+            window = self.quiet_window_start()
+            if window and self._last_window != window:
+                self._last_window = window
+                try:
+                    await self.warm_once()
+                except Exception as e:
+                    self.logger.error(f"漫画缓存预热失败: {str(e)}")
+            await asyncio.sleep(self.settings.check_interval)
+
+    async def _collect_comic_ids(self) -> List[str]:
+        settings = self.settings
+        listings = []
+        for order in settings.orders:
+            if settings.categories:
+                listings.extend(lambda c=category, o=order: list_comics(category=c, sort=o) for category in settings.categories)
+            else:
+                listings.append(lambda o=order: list_comics(sort=o))
+            listings.extend(lambda k=keyword, o=order: search_comics(k, sort=o) for keyword in settings.keywords)
+
+        comic_ids = []
+        for fetch in listings:
+            try:
+                response = await fetch()
+            except Exception as e:
+                self.logger.warning(f"获取预热榜单失败: {str(e)}")
+                continue
+
+            docs = response.get("data", {}).get("comics", {}).get("docs", [])
+            for comic in docs[:settings.top_n]:
+                comic_id = comic.get("_id")
+                if comic_id and comic_id not in comic_ids:
+                    comic_ids.append(comic_id)
+        return comic_ids
+
+    async def warm_once(self):
+        disk_used = await asyncio.to_thread(_dir_size, CACHE_DIR)
+        if disk_used >= self.settings.disk_budget_mb * 1024 * 1024:
+            self.logger.info("漫画缓存已达到磁盘预算，跳过本次预热")
+            return
+
+        comic_ids = await self._collect_comic_ids()
+        self.logger.info(f"开始预热漫画缓存，共 {len(comic_ids)} 部漫画")
+
+        # 预热期间单独限制并发和带宽，用户请求的下载不受影响
+        throttle = BandwidthThrottle(self.settings.bandwidth_kbps, self.settings.concurrency)
+        warmed = 0
+
+        for comic_id in comic_ids:
+            if not self.in_quiet_hours():
+                self.logger.info("已离开预热时段，停止预热")
+                break
+
+            try:
+                comic_info = await get_comic_info(comic_id)
+                episode_info = await get_comic_episodes(comic_id)
+            except Exception as e:
+                self.logger.warning(f"预热漫画 {comic_id} 信息失败: {str(e)}")
+                continue
+
+            title = comic_info.get("data", {}).get("comic", {}).get("title", "未知标题")
+            safe_title = re.sub(FILENAME_PATTERN, "_", title)
+            total_eps = len(episode_info.get("data", {}).get("eps", {}).get("docs", []))
+
+            for ep in range(1, min(self.settings.chapters, total_eps) + 1):
+                if disk_used >= self.settings.disk_budget_mb * 1024 * 1024:
+                    self.logger.info(f"漫画缓存已达到磁盘预算，预热结束，共预热 {warmed} 章")
+                    return
+
+                # 热重载后的带宽设置从下一章开始生效
+                throttle.rate = self.settings.bandwidth_kbps * 1024
+                before = throttle.consumed
+                try:
+                    await download_comic_images(comic_id, ep, safe_title, throttle)
+                except Exception as e:
+                    self.logger.warning(f"预热 '{title}' 第{ep}章失败: {str(e)}")
+                    continue
+                finally:
+                    disk_used += throttle.consumed - before
+                warmed += 1
+
+        self.logger.info(f"漫画缓存预热完成，共预热 {warmed} 章，下载 {throttle.consumed / 1024 / 1024:.1f}MB")
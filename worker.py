@@ -0,0 +1,313 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import sqlite3
+import argparse
+from contextlib import closing
+from typing import List, Dict, Any, Optional, Tuple
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+QUEUE_PATH = os.path.join(CACHE_DIR, "jobs.sqlite3")
+
+
+class WorkerPoolClosed(Exception):
+    pass
+
+
+class JobQueue:
+    """基于SQLite的本地下载任务队列，供插件进程与下载进程共享"""
+
+    def __init__(self, path: str = QUEUE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "comic_id TEXT NOT NULL, "
+                "ep INTEGER NOT NULL, "
+                "status TEXT NOT NULL DEFAULT 'pending', "
+                "result TEXT, "
+                "error TEXT, "
+                "worker INTEGER, "
+                "created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS limits ("
+                "worker INTEGER PRIMARY KEY, "
+                "snapshot TEXT NOT NULL, "
+                "updated_at REAL NOT NULL)"
+            )
+            # 运行中调整的设置和需要退出的下载进程，由下载进程在两次领取任务之间读取
+            conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS retired (worker INTEGER PRIMARY KEY)")
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if "worker" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN worker INTEGER")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def submit(self, comic_id: str, ep: int) -> int:
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (comic_id, ep, created_at) VALUES (?, ?, ?)",
+                (comic_id, ep, time.time())
+            )
+            return cursor.lastrowid
+
+    def claim(self) -> Optional[Tuple[int, str, int]]:
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, comic_id, ep FROM jobs WHERE status = 'pending' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row:
+                conn.execute("UPDATE jobs SET status = 'running', worker = ? WHERE id = ?", (os.getpid(), row[0]))
+            conn.execute("COMMIT")
+            return row
+
+    def finish(self, job_id: int, result: Dict[str, Any]):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', result = ? WHERE id = ?",
+                (json.dumps(result, ensure_ascii=False), job_id)
+            )
+
+    def fail(self, job_id: int, error: str):
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE jobs SET status = 'failed', error = ? WHERE id = ?", (error, job_id))
+
+    def poll(self, job_id: int) -> Optional[Tuple[str, Optional[str], Optional[str]]]:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT status, result, error FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def delete(self, job_id: int):
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def running_workers(self) -> List[int]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT DISTINCT worker FROM jobs WHERE status = 'running' AND worker IS NOT NULL")
+            return [row[0] for row in rows]
+
+    def set_poll_interval(self, poll_interval: float):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES ('poll_interval', ?)", (str(poll_interval),)
+            )
+
+    def retire(self, worker: int):
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT OR IGNORE INTO retired (worker) VALUES (?)", (worker,))
+
+    def unretire(self, worker: int = None):
+        """取消进程的退出标记，不指定进程时清空全部"""
+        with closing(self._connect()) as conn:
+            if worker is None:
+                conn.execute("DELETE FROM retired")
+            else:
+                conn.execute("DELETE FROM retired WHERE worker = ?", (worker,))
+
+    def control(self, worker: int = None) -> Tuple[bool, Optional[float]]:
+        """返回下载进程是否应退出，以及当前的轮询间隔（未设置时为None）"""
+        with closing(self._connect()) as conn:
+            retired, poll_interval = conn.execute(
+                "SELECT EXISTS(SELECT 1 FROM retired WHERE worker = ?), "
+                "(SELECT value FROM settings WHERE key = 'poll_interval')",
+                (worker or os.getpid(),)
+            ).fetchone()
+        return bool(retired), float(poll_interval) if poll_interval is not None else None
+
+    def report_limits(self, snapshot: Dict[str, Any]):
+        """下载进程写入自身的并发限制快照，供插件进程的状态命令展示"""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO limits (worker, snapshot, updated_at) VALUES (?, ?, ?)",
+                (os.getpid(), json.dumps(snapshot, ensure_ascii=False), time.time())
+            )
+
+    def worker_limits(self, workers: List[int]) -> List[Tuple[int, Dict[str, Any]]]:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                f"DELETE FROM limits WHERE worker NOT IN ({','.join('?' * len(workers))})", workers
+            )
+            rows = conn.execute("SELECT worker, snapshot FROM limits ORDER BY worker").fetchall()
+        return [(worker, json.loads(snapshot)) for worker, snapshot in rows]
+
+    def requeue_running(self, worker: int = None):
+        """将异常退出的下载进程遗留的进行中任务重新放回队列，不指定进程时处理全部"""
+        with closing(self._connect()) as conn:
+            if worker is None:
+                conn.execute("UPDATE jobs SET status = 'pending', worker = NULL WHERE status = 'running'")
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = 'pending', worker = NULL WHERE status = 'running' AND worker = ?",
+                    (worker,)
+                )
+
+
+class WorkerPool:
+    """管理独立下载进程，插件进程只负责投递任务和发送消息"""
+
+    def __init__(self, processes: int = 2, poll_interval: float = 0.5, queue_path: str = QUEUE_PATH):
+        self.processes = max(1, processes)
+        self.poll_interval = poll_interval
+        self.queue_path = queue_path
+        self.queue = JobQueue(queue_path)
+        self.workers: List[asyncio.subprocess.Process] = []
+        # 已标记退出、完成当前任务后自行退出的进程
+        self.retiring = set()
+        self.closed = False
+
+    async def start(self):
+        await asyncio.to_thread(self.queue.requeue_running)
+        await asyncio.to_thread(self.queue.unretire)
+        await asyncio.to_thread(self.queue.set_poll_interval, self.poll_interval)
+        await self._ensure_workers()
+
+    async def _ensure_workers(self):
+        if self.closed:
+            raise WorkerPoolClosed("下载进程已关闭")
+
+        for proc in self.workers:
+            if proc.returncode is not None:
+                await asyncio.to_thread(self.queue.requeue_running, proc.pid)
+                await asyncio.to_thread(self.queue.unretire, proc.pid)
+                self.retiring.discard(proc.pid)
+        self.workers = [proc for proc in self.workers if proc.returncode is None]
+        
+        active = [proc for proc in self.workers if proc.pid not in self.retiring]
+        if len(active) > self.processes:
+            # 优先让空闲进程退出，忙碌进程完成当前章节后再退出，不中断进行中的下载
+            busy = set(await asyncio.to_thread(self.queue.running_workers))
+            active.sort(key=lambda proc: proc.pid in busy)
+            for proc in active[:len(active) - self.processes]:
+                await asyncio.to_thread(self.queue.retire, proc.pid)
+                self.retiring.add(proc.pid)
+            active = active[len(active) - self.processes:]
+        
+        while len(active) < self.processes and self.retiring:
+            pid = self.retiring.pop()
+            await asyncio.to_thread(self.queue.unretire, pid)
+            active.append(next(proc for proc in self.workers if proc.pid == pid))
+        
+        while len(active) < self.processes:
+            proc = await self._spawn()
+            self.workers.append(proc)
+            active.append(proc)
+
+    async def resize(self, processes: int, poll_interval: float):
+        """运行中调整下载进程数量和轮询间隔，不终止正在下载的进程"""
+        self.processes = max(1, processes)
+        if poll_interval != self.poll_interval:
+            # 下载进程每轮从队列数据库读取轮询间隔，无需重启
+            self.poll_interval = poll_interval
+            await asyncio.to_thread(self.queue.set_poll_interval, poll_interval)
+        await self._ensure_workers()
+
+    async def _spawn(self) -> asyncio.subprocess.Process:
+        # 以 python -m 的方式启动，保证下载进程中的包内相对导入可用
+        package_root = os.path.abspath(__file__)
+        for _ in range(len(__package__.split(".")) + 1):
+            package_root = os.path.dirname(package_root)
+
+        return await asyncio.create_subprocess_exec(
+            sys.executable, "-m", f"{__package__}.worker",
+            "--queue", self.queue_path,
+            "--poll-interval", str(self.poll_interval),
+            cwd=package_root
+        )
+
+    async def run(self, comic_id: str, ep: int) -> Tuple[Dict[str, Any], List[str], str, List[str]]:
+        await self._ensure_workers()
+        job_id = await asyncio.to_thread(self.queue.submit, comic_id, ep)
+
+        try:
+            while True:
+                await asyncio.sleep(self.poll_interval)
+                status, result, error = await asyncio.to_thread(self.queue.poll, job_id)
+
+                if status == "done":
+                    data = json.loads(result)
+                    return data["comic_info"], data["images"], data["title"], data["merged_images"]
+                if status == "failed":
+                    raise Exception(error)
+
+                # 下载进程已关闭时由调用方改为在插件进程内下载，_ensure_workers会抛出WorkerPoolClosed
+                if status in ("pending", "running"):
+                    await self._ensure_workers()
+        finally:
+            await asyncio.to_thread(self.queue.delete, job_id)
+
+    async def limits(self) -> List[Tuple[int, Dict[str, Any]]]:
+        """各下载进程最近一次上报的并发限制快照，已退出进程的记录会被清理"""
+        pids = [proc.pid for proc in self.workers if proc.returncode is None]
+        return await asyncio.to_thread(self.queue.worker_limits, pids)
+
+    async def _terminate_workers(self):
+        workers, self.workers = self.workers, []
+        self.retiring.clear()
+        for proc in workers:
+            if proc.returncode is None:
+                proc.terminate()
+        for proc in workers:
+            await proc.wait()
+            await asyncio.to_thread(self.queue.requeue_running, proc.pid)
+
+    async def stop(self):
+        """关闭下载进程池，等待进程退出并把未完成的任务放回队列"""
+        self.closed = True
+        await self._terminate_workers()
+
+
+async def _serve(queue: JobQueue, poll_interval: float):
+    from .get_image import get_pica_images, get_client
+    from .forward_message import merge_images
+    from .config import config_service
+
+    config_service.start_watching()
+
+    while True:
+        retired, interval = queue.control()
+        if retired:
+            # 进程池缩容时在两次任务之间退出，不会丢弃进行中的下载，退出标记由进程池清理
+            return
+
+        job = queue.claim()
+        if job is None:
+            await asyncio.sleep(interval or poll_interval)
+            continue
+
+        job_id, comic_id, ep = job
+        try:
+            comic_info, images, title = await get_pica_images(comic_id, ep)
+            merged_images = await merge_images(images)
+            queue.finish(job_id, {
+                "comic_info": comic_info,
+                "images": [os.path.abspath(path) for path in images],
+                "title": title,
+                "merged_images": [os.path.abspath(path) for path in merged_images]
+            })
+        except Exception as e:
+            print(f"下载进程处理任务失败: {comic_id} 第{ep}章, 错误: {e}")
+            queue.fail(job_id, str(e))
+
+        # 下载在本进程的client中进行，插件进程通过队列数据库查看这里的并发限制
+        queue.report_limits(get_client().limits())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="漫画下载进程")
+    parser.add_argument("--queue", default=QUEUE_PATH)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    args = parser.parse_args()
+
+    asyncio.run(_serve(JobQueue(args.queue), args.poll_interval))
+
+
+if __name__ == "__main__":
+    main()